@@ -0,0 +1,302 @@
+#!/usr/bin/env python3
+"""
+Offline audio previews of the pattern corpus
+
+Every pattern is rendered to a short mono 16-bit file: one one-shot drum
+sound per event, placed at the event's time at the pattern's bpm_default
+and scaled by velocity / 127 (the gains of the playback section). The
+sounds are synthesized with NumPy, or loaded from a directory of
+<instrument>.wav one-shots with --samples. The ring-out of the last loop
+is wrapped around to the start, so a preview loops seamlessly.
+
+Previews are rendered in a process pool. previews/manifest.json records
+the content hash of the source pattern and the render settings of each
+preview, and patterns whose hash and settings are unchanged are skipped.
+--format pcm writes headerless s16le files, ready for
+`opusenc --raw --raw-chan 1 --raw-rate <rate>`.
+
+Requires NumPy.
+"""
+
+import argparse
+import functools
+import io
+import json
+import os
+import time
+import wave
+from pathlib import Path
+
+import numpy as np
+
+from pattern_engine import (DEFAULT_BPM, INSTRUMENTS, NON_PATTERN_FILES, content_hash, load_events,
+                            parallel_map, write_if_changed)
+
+PREVIEWS_DIR = "previews"
+PREVIEW_MANIFEST = "manifest.json"
+FORMATS = ("wav", "pcm")
+
+DEFAULT_RATE = 22050
+DEFAULT_LOOPS = 1
+
+# Mix level of a velocity 127 hit; the mix is scaled down further only if
+# it would clip
+MASTER_GAIN = 0.5
+
+# Partials of the metallic (cymbal) voices, in Hz
+METAL_PARTIALS = (205.3, 304.4, 369.6, 522.7, 540.0, 800.0)
+
+
+def _time(rate, length):
+    return np.arange(int(rate * length), dtype=np.float64) / rate
+
+
+def _tone(rate, start_hz, end_hz, sweep, decay, length):
+    """Sine whose pitch glides from start_hz to end_hz over ~sweep seconds"""
+    t = _time(rate, length)
+    phase = 2 * np.pi * (end_hz * t + (start_hz - end_hz) * sweep * (1 - np.exp(-t / sweep)))
+    return np.sin(phase) * np.exp(-t / decay)
+
+
+def _noise(rate, decay, length, brightness, seed):
+    """Decaying white noise, high-passed brightness times by differencing"""
+    t = _time(rate, length)
+    noise = np.random.default_rng(seed).uniform(-1, 1, len(t))
+    for _ in range(brightness):
+        noise = np.diff(noise, prepend=0.0) / 2
+    return noise * np.exp(-t / decay)
+
+
+def _metal(rate, decay, length, seed):
+    """Inharmonic square wave partials plus noise, high-passed"""
+    t = _time(rate, length)
+    partials = sum(np.sign(np.sin(2 * np.pi * hz * 8 * t)) for hz in METAL_PARTIALS) / len(METAL_PARTIALS)
+    mix = np.diff(partials, prepend=0.0) * 0.6 + _noise(rate, length, length, 2, seed) * 0.8
+    return mix * np.exp(-t / decay)
+
+
+# Instrument -> synthesizer of its one-shot at a sample rate
+SYNTH_VOICES = {
+    "kick": lambda rate: _tone(rate, 150, 45, 0.04, 0.2, 0.5),
+    "snare": lambda rate: (_tone(rate, 240, 180, 0.02, 0.06, 0.3) * 0.5
+                           + _noise(rate, 0.08, 0.3, 1, 1) * 0.9),
+    "hihat_closed": lambda rate: _metal(rate, 0.025, 0.15, 2),
+    "hihat_open": lambda rate: _metal(rate, 0.25, 0.8, 3),
+    "ride": lambda rate: (_metal(rate, 0.6, 1.5, 4) * 0.5
+                          + _tone(rate, 620, 620, 1, 0.8, 1.5) * 0.15),
+    "crash": lambda rate: (_metal(rate, 0.9, 2.0, 5) * 0.6
+                           + _noise(rate, 0.7, 2.0, 1, 6) * 0.5),
+    "tom_high": lambda rate: _tone(rate, 260, 200, 0.05, 0.2, 0.6),
+    "tom_mid": lambda rate: _tone(rate, 200, 150, 0.05, 0.25, 0.7),
+    "tom_floor": lambda rate: _tone(rate, 140, 100, 0.05, 0.3, 0.8),
+}
+
+# Voice of instruments that have neither a synthesizer nor a sample
+FALLBACK_VOICE = "snare"
+
+
+def read_wav(filepath, rate):
+    """Mono float samples of a 16-bit PCM WAV file, resampled to rate"""
+    with wave.open(str(filepath), "rb") as f:
+        if f.getsampwidth() != 2:
+            raise ValueError(f"{filepath}: only 16-bit PCM samples are supported")
+        channels = f.getnchannels()
+        source_rate = f.getframerate()
+        frames = np.frombuffer(f.readframes(f.getnframes()), dtype="<i2")
+    samples = frames.reshape(-1, channels).mean(axis=1) / 32768
+    if source_rate != rate:
+        positions = np.arange(int(len(samples) * rate / source_rate)) * (source_rate / rate)
+        samples = np.interp(positions, np.arange(len(samples)), samples)
+    return samples
+
+
+def sample_files(samples_dir):
+    """Instrument -> one-shot WAV file of a samples directory"""
+    if samples_dir is None:
+        return {}
+    return {path.stem: path for path in sorted(Path(samples_dir).glob("*.wav"))}
+
+
+@functools.lru_cache(maxsize=None)
+def load_voices(rate, samples_dir=None):
+    """Instrument -> one-shot samples at rate; bundled samples win over synthesis"""
+    voices = {name: synth(rate) for name, synth in SYNTH_VOICES.items()}
+    for name, path in sample_files(samples_dir).items():
+        voices[name] = read_wav(path, rate)
+    return voices
+
+
+def render_pattern(pattern, voices, rate=DEFAULT_RATE, loops=DEFAULT_LOOPS):
+    """int16 samples of a pattern played `loops` times at its bpm_default
+
+    The output is exactly `loops` loop lengths long; sound that rings past
+    the end is mixed back into the start.
+    """
+    events = load_events(pattern)
+    bpm = pattern.get("bpm_default") or pattern.get("bpm") or DEFAULT_BPM
+    loop_ticks = round(pattern.get("loop_length_beats", 4) * events.ppq)
+    samples_per_tick = rate * 60 / (bpm * events.ppq)
+    length = round(loops * loop_ticks * samples_per_tick)
+
+    ticks = np.frombuffer(events.ticks, dtype=events.ticks.typecode).astype(np.int64)
+    ticks = (ticks[None, :] + loop_ticks * np.arange(loops)[:, None]).ravel()
+    starts = np.rint(ticks * samples_per_tick).astype(np.int64)
+    instruments = np.tile(np.frombuffer(events.instruments, dtype=np.uint8), loops)
+    gains = np.tile(np.frombuffer(events.velocities, dtype=np.uint8) / 127, loops)
+
+    tail = max(len(voice) for voice in voices.values())
+    mix = np.zeros(length + tail)
+    for inst in np.unique(instruments):
+        voice = voices.get(INSTRUMENTS[inst], voices[FALLBACK_VOICE])
+        selected = instruments == inst
+        for start, gain in zip(starts[selected], gains[selected]):
+            if start < length:
+                mix[start:start + len(voice)] += gain * voice
+
+    out = mix[:length]
+    ring = mix[length:]
+    while ring.any():
+        out[:min(len(ring), length)] += ring[:length]
+        ring = ring[length:]
+
+    out *= MASTER_GAIN
+    peak = np.abs(out).max() if length else 0.0
+    if peak > 1:
+        out /= peak
+    return np.rint(out * 32767).astype("<i2")
+
+
+def encode_preview(samples, rate, fmt):
+    """File bytes of int16 mono samples as WAV or raw PCM"""
+    if fmt == "pcm":
+        return samples.tobytes()
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as f:
+        f.setnchannels(1)
+        f.setsampwidth(2)
+        f.setframerate(rate)
+        f.writeframes(samples.tobytes())
+    return buffer.getvalue()
+
+
+def render_file(task):
+    """Render one pattern file to its preview file (process pool task)"""
+    source, target, settings = task
+    pattern = json.loads(Path(source).read_bytes())
+    voices = load_voices(settings["rate"], settings["samples_dir"])
+    samples = render_pattern(pattern, voices, settings["rate"], settings["loops"])
+    data = encode_preview(samples, settings["rate"], settings["format"])
+    target = Path(target)
+    temp = target.with_name(target.name + f".{os.getpid()}.tmp")
+    temp.write_bytes(data)
+    os.replace(temp, target)
+    return len(data)
+
+
+def render_settings(rate, loops, fmt, samples_dir):
+    """Everything besides the pattern that changes a preview's bytes"""
+    return {
+        "rate": rate,
+        "loops": loops,
+        "format": fmt,
+        "samples_dir": str(samples_dir) if samples_dir is not None else None,
+        "samples": {name: content_hash(path.read_bytes())[:16]
+                    for name, path in sample_files(samples_dir).items()},
+    }
+
+
+def load_preview_manifest(output_dir):
+    """(settings, {preview filename: source hash}) of the last run"""
+    manifest_file = Path(output_dir) / PREVIEW_MANIFEST
+    if not manifest_file.exists():
+        return None, {}
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        manifest = json.load(f)
+    return manifest.get("settings"), manifest.get("previews", {})
+
+
+def save_preview_manifest(output_dir, settings, previews):
+    """Write the preview manifest if its content changed"""
+    manifest = {"version": 1, "settings": settings, "previews": dict(sorted(previews.items()))}
+    data = json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8")
+    write_if_changed(Path(output_dir) / PREVIEW_MANIFEST, data, content_hash(data))
+
+
+def render_corpus(patterns_dir, output_dir=None, rate=DEFAULT_RATE, loops=DEFAULT_LOOPS, fmt="wav",
+                  samples_dir=None, workers=None, force=False):
+    """Render the preview of every pattern whose content or settings changed
+
+    Returns (rendered, unchanged, removed) filename lists. Previews of
+    patterns that no longer exist are deleted.
+    """
+    patterns_dir = Path(patterns_dir)
+    output_dir = Path(output_dir) if output_dir is not None else patterns_dir / PREVIEWS_DIR
+    output_dir.mkdir(parents=True, exist_ok=True)
+    settings = render_settings(rate, loops, fmt, samples_dir)
+    known_settings, known = load_preview_manifest(output_dir)
+    if force or known_settings != settings:
+        known = {}
+
+    previews = {}
+    tasks = []
+    unchanged = []
+    sources = sorted(path for path in patterns_dir.glob("*.json") if path.name not in NON_PATTERN_FILES)
+    for source in sources:
+        name = f"{source.stem}.{fmt}"
+        digest = content_hash(source.read_bytes())
+        previews[name] = digest
+        if known.get(name) == digest and (output_dir / name).exists():
+            unchanged.append(name)
+        else:
+            tasks.append((source, output_dir / name, settings))
+
+    list(parallel_map(render_file, tasks, workers))
+
+    removed = []
+    for suffix in FORMATS:
+        for path in output_dir.glob(f"*.{suffix}"):
+            if path.name not in previews:
+                path.unlink()
+                removed.append(path.name)
+
+    save_preview_manifest(output_dir, settings, previews)
+    return [Path(task[1]).name for task in tasks], unchanged, sorted(removed)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Render audio previews of every pattern")
+    parser.add_argument("patterns_dir", nargs="?", default="patterns")
+    parser.add_argument("--output-dir", default=None,
+                        help=f"Preview directory (default: <patterns_dir>/{PREVIEWS_DIR})")
+    parser.add_argument("--rate", type=int, default=DEFAULT_RATE,
+                        help="Sample rate in Hz (default: %(default)s)")
+    parser.add_argument("--loops", type=int, default=DEFAULT_LOOPS,
+                        help="Times the pattern is played in each preview (default: %(default)s)")
+    parser.add_argument("--format", choices=FORMATS, default="wav",
+                        help="wav, or headerless s16le pcm for an Opus encoder (default: %(default)s)")
+    parser.add_argument("--samples", default=None,
+                        help="Directory of <instrument>.wav one-shots to use instead of the synthesized sounds")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true",
+                        help="Render every pattern, ignoring the preview manifest")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.loops < 1:
+        raise SystemExit("--loops must be at least 1")
+
+    start = time.perf_counter()
+    rendered, unchanged, removed = render_corpus(
+        args.patterns_dir, args.output_dir, args.rate, args.loops, args.format,
+        args.samples, args.workers, args.force)
+    elapsed = time.perf_counter() - start
+
+    print(f"Rendered {len(rendered)} previews in {elapsed:.2f}s "
+          f"({len(unchanged)} unchanged, {len(removed)} removed)")
+
+
+if __name__ == "__main__":
+    main()
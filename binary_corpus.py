@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+"""
+Binary pattern corpus for batch tooling
+
+Packs every pattern's events into one file that is read through mmap, so
+loading the corpus costs a header parse instead of one JSON parse per
+pattern. All integers are little-endian.
+
+Layout:
+    header        HEADER_FORMAT (magic, version, counts, section offsets)
+    instruments   instrument_count x 16-byte NUL padded names
+    patterns      pattern_count x PATTERN_DTYPE records
+    events        event_count x EVENT_DTYPE records, grouped by pattern
+
+A pattern record holds its id, ppq, bpm, loop length and the
+[event_start, event_start + event_count) range into the events section.
+"""
+
+import argparse
+import mmap
+import struct
+import time
+
+import numpy as np
+
+import pattern_engine
+
+MAGIC = b"DRMC"
+FORMAT_VERSION = 1
+
+# magic, version, instrument count, pattern count, event count,
+# instruments offset, patterns offset, events offset
+HEADER_FORMAT = "<4sHHIIQQQ"
+HEADER_SIZE = struct.calcsize(HEADER_FORMAT)
+
+INSTRUMENT_NAME_SIZE = 16
+
+PATTERN_DTYPE = np.dtype([
+    ("id", "S32"),
+    ("event_start", "<u4"),
+    ("event_count", "<u4"),
+    ("ppq", "<u2"),
+    ("bpm", "<u2"),
+    ("loop_ticks", "<u4"),
+])
+
+EVENT_DTYPE = np.dtype([
+    ("tick", "<u4"),
+    ("instrument", "u1"),
+    ("velocity", "u1"),
+])
+
+
+def write_corpus(path, patterns):
+    """Write patterns (dicts as produced by the generators or read from JSON)
+
+    Returns the number of patterns written.
+    """
+    records = []
+    event_chunks = []
+    event_start = 0
+    for pattern in patterns:
+        events = pattern["events"]
+        if not isinstance(events, pattern_engine.EventBuffer):
+            events = pattern_engine.load_events(pattern)
+        pattern_id, bpm, loop_beats = pattern_engine.pattern_metadata(pattern)
+        encoded_id = pattern_id.encode("utf-8")
+        if len(encoded_id) > PATTERN_DTYPE["id"].itemsize:
+            raise ValueError(f"Pattern id {pattern_id!r} is too long for the corpus format")
+        if int(bpm) != bpm or not 0 <= bpm <= np.iinfo(PATTERN_DTYPE["bpm"]).max:
+            raise ValueError(f"Pattern {pattern_id!r} has bpm {bpm!r}, the corpus format "
+                             f"only stores whole numbers up to {np.iinfo(PATTERN_DTYPE['bpm']).max}")
+
+        chunk = np.empty(len(events), dtype=EVENT_DTYPE)
+        chunk["tick"] = events.ticks
+        chunk["instrument"] = events.instruments
+        chunk["velocity"] = events.velocities
+        event_chunks.append(chunk)
+
+        records.append((encoded_id, event_start, len(events),
+                        events.ppq, int(bpm), round(loop_beats * events.ppq)))
+        event_start += len(events)
+
+    instruments = pattern_engine.INSTRUMENTS
+    encoded_names = [name.encode("utf-8") for name in instruments]
+    for name, encoded in zip(instruments, encoded_names):
+        if len(encoded) > INSTRUMENT_NAME_SIZE:
+            raise ValueError(f"Instrument name {name!r} is too long for the corpus format")
+    instrument_table = b"".join(encoded.ljust(INSTRUMENT_NAME_SIZE, b"\0")
+                                for encoded in encoded_names)
+    pattern_table = np.array(records, dtype=PATTERN_DTYPE)
+    events = np.concatenate(event_chunks) if event_chunks else np.empty(0, EVENT_DTYPE)
+
+    instruments_offset = HEADER_SIZE
+    patterns_offset = instruments_offset + len(instrument_table)
+    events_offset = patterns_offset + pattern_table.nbytes
+    header = struct.pack(HEADER_FORMAT, MAGIC, FORMAT_VERSION, len(instruments),
+                         len(pattern_table), len(events),
+                         instruments_offset, patterns_offset, events_offset)
+
+    with open(path, 'wb') as f:
+        f.write(header)
+        f.write(instrument_table)
+        f.write(pattern_table.tobytes())
+        f.write(events.tobytes())
+
+    return len(pattern_table)
+
+
+class CorpusReader:
+    """Memory-mapped reader of a binary corpus
+
+    `patterns` and `events` are read-only NumPy views of the mapped file;
+    nothing is copied until a caller copies it. Views handed out by
+    pattern_events() stay valid after close(): the mapping is then
+    released when the last of them goes away.
+    """
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        (magic, version, instrument_count, pattern_count, event_count,
+         instruments_offset, patterns_offset, events_offset) = struct.unpack_from(
+            HEADER_FORMAT, self._map)
+        if magic != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not a binary pattern corpus")
+        if version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"Unsupported corpus version {version}")
+
+        self.instruments = [
+            self._map[offset:offset + INSTRUMENT_NAME_SIZE].rstrip(b"\0").decode("utf-8")
+            for offset in range(instruments_offset,
+                                instruments_offset + instrument_count * INSTRUMENT_NAME_SIZE,
+                                INSTRUMENT_NAME_SIZE)
+        ]
+        self.patterns = np.frombuffer(self._map, PATTERN_DTYPE, pattern_count, patterns_offset)
+        self.events = np.frombuffer(self._map, EVENT_DTYPE, event_count, events_offset)
+        self._index = None
+
+    def __len__(self):
+        return len(self.patterns)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def index_of(self, pattern_id):
+        """Position of a pattern id (the id lookup table is built on first use)"""
+        if self._index is None:
+            self._index = {
+                raw.decode("utf-8"): i for i, raw in enumerate(self.patterns["id"].tolist())
+            }
+        return self._index[pattern_id]
+
+    def pattern_events(self, key):
+        """Zero-copy EVENT_DTYPE view of one pattern's events, by position or id"""
+        i = self.index_of(key) if isinstance(key, str) else key
+        record = self.patterns[i]
+        start = int(record["event_start"])
+        return self.events[start:start + int(record["event_count"])]
+
+    def close(self):
+        """Release the NumPy views and unmap the file
+
+        If callers still hold views of the map, it cannot be closed yet;
+        the reader drops its reference and the map is closed once the
+        last view is garbage collected.
+        """
+        self.patterns = None
+        self.events = None
+        if self._map is not None:
+            try:
+                self._map.close()
+            except BufferError:
+                pass
+            self._map = None
+        self._file.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Write or inspect a binary pattern corpus")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    write = subparsers.add_parser("write", help="Write a binary corpus")
+    write.add_argument("output")
+    write.add_argument("--patterns-dir", default="patterns",
+                       help="Read patterns from this directory (default: %(default)s)")
+    write.add_argument("--generate", action="store_true",
+                       help="Build patterns with the generators instead of reading JSON")
+    write.add_argument("--seed", type=int, default=pattern_engine.DEFAULT_SEED)
+
+    info = subparsers.add_parser("info", help="Summarize a binary corpus")
+    info.add_argument("corpus")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.command == "write":
+        if args.generate:
+            patterns = pattern_engine.patterns_from_generators(args.seed)
+        else:
+            patterns = pattern_engine.patterns_from_dir(args.patterns_dir)
+        count = write_corpus(args.output, patterns)
+        print(f"Wrote {count} patterns to {args.output}")
+        return
+
+    start = time.perf_counter()
+    with CorpusReader(args.corpus) as reader:
+        elapsed = time.perf_counter() - start
+        print(f"Opened {args.corpus} in {elapsed * 1000:.2f} ms")
+        print(f"  {len(reader)} patterns, {len(reader.events)} events")
+        print(f"  instruments: {', '.join(reader.instruments)}")
+
+
+if __name__ == "__main__":
+    main()
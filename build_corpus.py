@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Build the whole pattern corpus in one process
+
+Loads every generator module through the pattern engine and writes all
+registered groups to patterns/.
+"""
+
+import argparse
+from pathlib import Path
+
+import pattern_engine
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--ppq", type=int, default=pattern_engine.PPQ,
+                        help="Tick resolution in ticks per quarter note (default: %(default)s)")
+    parser.add_argument("--seed", type=int, default=pattern_engine.DEFAULT_SEED,
+                        help="Corpus seed; each pattern derives its own seed from it (default: %(default)s)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: one per CPU)")
+    parser.add_argument("--force", action="store_true",
+                        help="Ignore the build manifest and compare every file on disk")
+    parser.add_argument("--compact", action="store_true",
+                        help="Write minified JSON without indentation")
+    parser.add_argument("--compress", action="store_true",
+                        help="Also write precompressed .gz and .br siblings")
+    parser.add_argument("--event-format", choices=pattern_engine.EVENT_FORMATS, default="dicts",
+                        help="Encoding of pattern events (default: %(default)s)")
+    args = parser.parse_args()
+    try:
+        pattern_engine.set_ppq(args.ppq)
+    except ValueError as e:
+        parser.error(f"--ppq: {e}")
+    return args
+
+
+def main():
+    args = parse_args()
+
+    groups = pattern_engine.load_generators()
+    patterns_dir = Path(__file__).parent / "patterns"
+
+    written, changed = pattern_engine.write_groups(sorted(groups), patterns_dir,
+                                                   seed=args.seed, workers=args.workers,
+                                                   force=args.force, compact=args.compact,
+                                                   compress=args.compress,
+                                                   event_format=args.event_format)
+
+    print(f"\n✓ Generated {len(written)} patterns in {len(groups)} groups ({len(changed)} changed)")
+    print("\nDone!")
+
+
+if __name__ == "__main__":
+    main()
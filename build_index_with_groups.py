@@ -1,99 +1,530 @@
 #!/usr/bin/env python3
 """
 Build index.json with group structure for lazy loading
+
+The build streams: filenames come from a directory scan, each pattern is
+read once (in a process pool) for its features and bundle bytes, and the
+bundles are written as results arrive. Pattern bytes are only held for
+one chunk; the features, offsets and hashes of one group are kept until
+the group's index entry is written. Files that cannot be parsed are
+reported and left out of the index.
 """
 
+import argparse
+import hashlib
 import json
+import os
+import re
+import shutil
 from pathlib import Path
 from collections import defaultdict
 
+from pattern_engine import (GROUP_REGISTRY, HASH_LENGTH, NON_PATTERN_FILES, content_hash,
+                            group_matcher, load_events, parallel_map, pattern_features,
+                            write_if_changed)
+
+BUNDLES_DIR = "bundles"
+SHARDS_DIR = "shards"
+CATALOG_NAME = "catalog.json"
+
+# Content-hashed copies of the patterns and the name -> copy mapping
+HASHED_DIR = "content"
+HASHED_MAP_NAME = "hashes.json"
+
+# Delta documents between consecutive corpus revisions, and the current
+# revision's filename -> hash map that the next build diffs against
+DELTAS_DIR = "deltas"
+REVISION_STATE_NAME = "revision.json"
+
+# Patterns per index page; pages of a group hold consecutive slices of its
+# sorted pattern list, so page n always starts at pattern n * page size
+DEFAULT_PAGE_SIZE = 100
+
+# Patterns handed to the worker pool at a time; bounds the results in flight
+CHUNK_SIZE = 1024
+
+INDEX_VERSION = "2.1"
+
+# Top-level fields of a pattern that the index needs
+INDEX_FIELDS = ("ppq", "loop_length_beats", "events")
+
+WHITESPACE = re.compile(r"[ \t\n\r]*")
+
+def scan_patterns(patterns_dir):
+    """Yield the pattern filenames of a directory, in directory order"""
+    with os.scandir(patterns_dir) as entries:
+        for entry in entries:
+            name = entry.name
+            if name.endswith(".json") and name not in NON_PATTERN_FILES and entry.is_file():
+                yield name
+
+def read_fields(data, fields, last="events"):
+    """Decode only some top-level fields of a pattern's JSON
+
+    Top-level values are decoded in document order and parsing stops after
+    the `last` key, so the notation that follows the events in generated
+    files is never parsed.
+    """
+    decoder = json.JSONDecoder()
+    text = data.decode("utf-8")
+    found = {}
+
+    pos = WHITESPACE.match(text).end()
+    if text[pos:pos + 1] != "{":
+        raise ValueError("Pattern is not a JSON object")
+    pos = WHITESPACE.match(text, pos + 1).end()
+    if text[pos:pos + 1] == "}":
+        return found
+
+    while True:
+        key, pos = decoder.raw_decode(text, pos)
+        pos = WHITESPACE.match(text, pos).end()
+        if text[pos:pos + 1] != ":":
+            raise ValueError(f"Expected ':' at position {pos}")
+        pos = WHITESPACE.match(text, pos + 1).end()
+        value, pos = decoder.raw_decode(text, pos)
+        if key in fields:
+            found[key] = value
+        if key == last:
+            return found
+        pos = WHITESPACE.match(text, pos).end()
+        if text[pos:pos + 1] == "}":
+            return found
+        if text[pos:pos + 1] != ",":
+            raise ValueError(f"Expected ',' at position {pos}")
+        pos = WHITESPACE.match(text, pos + 1).end()
+
+def index_pattern(filepath):
+    """Features, raw bytes, content hash and error of one pattern file
+
+    Runs in a worker process. A file that cannot be read or parsed returns
+    (None, None, None, message) instead of raising, so one bad pattern does
+    not abort the build.
+    """
+    try:
+        data = filepath.read_bytes()
+        fields = read_fields(data, INDEX_FIELDS)
+        features = pattern_features(load_events(fields), fields.get("loop_length_beats", 4))
+    except (OSError, ValueError, KeyError, TypeError, OverflowError) as e:
+        return None, None, None, f"{type(e).__name__}: {e}"
+    return features, data, content_hash(data)[:HASH_LENGTH], None
+
+def hashed_name(filename, digest):
+    """Path of the content-hashed copy of a pattern, e.g. content/8beat_a_001.<hash>.json"""
+    stem = filename[:-len(".json")]
+    return f"{HASHED_DIR}/{stem}.{digest}.json"
+
+def write_hashed_copy(patterns_dir, filename, data, digest):
+    """Write the content-hashed copy of a pattern and return its path
+
+    A copy that exists already has the same content, as its name says, and
+    is left alone.
+    """
+    path = hashed_name(filename, digest)
+    target = patterns_dir / path
+    if not target.exists():
+        target.parent.mkdir(exist_ok=True)
+        target.write_bytes(data)
+    return path
+
+def write_hashed_map(patterns_dir, mapping, revision):
+    """Write the filename -> hashed copy mapping and remove stale copies
+
+    Copies of the previous revision stay for one more revision, so clients
+    that loaded the previous index.json just before a deploy can still
+    fetch them; hashes.json lists them under "previous".
+    """
+    map_file = patterns_dir / HASHED_MAP_NAME
+    try:
+        with open(map_file, 'r', encoding='utf-8') as f:
+            old = json.load(f)
+    except FileNotFoundError:
+        old = {}
+    if old.get("revision") == revision:
+        retained = set(old.get("previous", []))
+    else:
+        retained = set(old.get("files", {}).values())
+
+    current = set(mapping.values())
+    retained -= current
+    content_dir = patterns_dir / HASHED_DIR
+    if content_dir.exists():
+        for path in content_dir.iterdir():
+            name = f"{HASHED_DIR}/{path.name}"
+            if name not in current and name not in retained:
+                path.unlink()
+    retained = {name for name in retained if (patterns_dir / name).exists()}
+
+    data = json.dumps({"version": INDEX_VERSION, "revision": revision, "files": mapping,
+                       "previous": sorted(retained)},
+                      indent=2, ensure_ascii=False).encode("utf-8")
+    write_if_changed(map_file, data, content_hash(data))
+
+def load_revision_state(patterns_dir):
+    """Revision and filename -> hash map of the previous build
+
+    Read from deltas/revision.json, which holds only those two things.
+    Indexes built before that file existed are read once in full; the hash
+    map is None when there is no index yet or it predates content hashes,
+    in which case no delta can be computed against it.
+    """
+    try:
+        with open(patterns_dir / DELTAS_DIR / REVISION_STATE_NAME, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        return state["revision"], state["hashes"]
+    except FileNotFoundError:
+        pass
+
+    try:
+        with open(patterns_dir / "index.json", 'r', encoding='utf-8') as f:
+            index = json.load(f)
+    except FileNotFoundError:
+        return 0, None
+    revision = index.get("revision", 0)
+    if not all("hashes" in group for group in index["groups"]):
+        return revision, None
+    hashes = {}
+    for group in index["groups"]:
+        hashes.update(zip(group["patterns"], group["hashes"]))
+    return revision, hashes
+
+def write_revision_state(patterns_dir, revision, hashes):
+    """Write deltas/revision.json for the next build's delta"""
+    state = {"revision": revision, "hashes": dict(sorted(hashes.items()))}
+    data = json.dumps(state, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    (patterns_dir / DELTAS_DIR).mkdir(exist_ok=True)
+    write_if_changed(patterns_dir / DELTAS_DIR / REVISION_STATE_NAME, data, content_hash(data))
+
+def compute_delta(previous, current):
+    """Added, removed and modified patterns between two filename -> hash maps"""
+    return {
+        "added": {name: current[name] for name in sorted(current.keys() - previous.keys())},
+        "removed": sorted(previous.keys() - current.keys()),
+        "modified": {
+            name: current[name]
+            for name in sorted(current.keys() & previous.keys())
+            if current[name] != previous[name]
+        }
+    }
+
+def write_delta(patterns_dir, revision, delta):
+    """Write deltas/<revision>.json, the changes from revision - 1 to revision"""
+    document = {"from": revision - 1, "to": revision, **delta}
+    data = json.dumps(document, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+    (patterns_dir / DELTAS_DIR).mkdir(exist_ok=True)
+    path = f"{DELTAS_DIR}/{revision:06d}.json"
+    write_if_changed(patterns_dir / path, data, content_hash(data))
+    return path
+
+def file_digest(filepath):
+    """SHA-256 of a file, read in blocks"""
+    digest = hashlib.sha256()
+    with open(filepath, 'rb') as f:
+        for block in iter(lambda: f.read(1 << 16), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+class BundleWriter:
+    """Streams patterns into a bundle file holding them in one JSON array
+
+    Each pattern is copied byte for byte from its file, so the range
+    [offset, offset + length) of the bundle is exactly that pattern's JSON
+    and can be fetched on its own with an HTTP Range request.
+
+    The bundle is written to a temporary file and only replaces the
+    existing one when its content changed.
+    """
+
+    def __init__(self, patterns_dir, name):
+        self.path = f"{BUNDLES_DIR}/{name}.json"
+        self.target = patterns_dir / self.path
+        self.target.parent.mkdir(exist_ok=True)
+        self.temp = self.target.with_name(self.target.name + ".tmp")
+        self.file = open(self.temp, 'wb')
+        self.digest = hashlib.sha256()
+        self.offsets = []
+        self.position = 0
+        self._write(b"[")
+
+    def _write(self, chunk):
+        self.file.write(chunk)
+        self.digest.update(chunk)
+        self.position += len(chunk)
+
+    def add(self, data):
+        """Append a pattern and return its [offset, length] in the bundle"""
+        if self.offsets:
+            self._write(b",\n")
+        self.offsets.append([self.position, len(data)])
+        self._write(data)
+        return self.offsets[-1]
+
+    def close(self):
+        """Finish the bundle and return its entry for index.json"""
+        self._write(b"]\n")
+        self.file.close()
+        if (self.target.exists() and self.target.stat().st_size == self.position
+                and file_digest(self.target) == self.digest.hexdigest()):
+            self.temp.unlink()
+        else:
+            os.replace(self.temp, self.target)
+        return {
+            "file": self.path,
+            "size": self.position,
+            "offsets": self.offsets
+        }
+
+    def discard(self):
+        """Remove the temporary file of a bundle that was not closed"""
+        if not self.file.closed:
+            self.file.close()
+        self.temp.unlink(missing_ok=True)
+
+class ShardWriter:
+    """Writes one group's index as pages of page_size patterns
+
+    A page lists its patterns with their features and bundle offsets, plus
+    the path of the next page as a cursor (null on the last page). Pages
+    beyond the group's current page count are removed.
+    """
+
+    def __init__(self, patterns_dir, group, page_size):
+        self.patterns_dir = patterns_dir
+        self.group_id = group["id"]
+        self.patterns = group["patterns"]
+        self.page_size = page_size
+        self.pages = max(1, -(-len(self.patterns) // page_size))
+        self.page = 0
+        self.features = []
+        self.offsets = []
+        self.hashes = []
+        (patterns_dir / SHARDS_DIR / self.group_id).mkdir(parents=True, exist_ok=True)
+
+    def page_path(self, page):
+        return f"{SHARDS_DIR}/{self.group_id}/{page:04d}.json"
+
+    def add(self, features, offset, digest):
+        self.features.append(features)
+        self.offsets.append(offset)
+        self.hashes.append(digest)
+        if len(self.features) == self.page_size:
+            self._flush()
+
+    def _flush(self):
+        start = self.page * self.page_size
+        page = {
+            "group": self.group_id,
+            "page": self.page,
+            "pages": self.pages,
+            "patterns": self.patterns[start:start + len(self.features)],
+            "features": self.features,
+            "offsets": self.offsets,
+            "hashes": self.hashes,
+            "next": self.page_path(self.page + 1) if self.page + 1 < self.pages else None
+        }
+        data = json.dumps(page, indent=2, ensure_ascii=False).encode("utf-8")
+        write_if_changed(self.patterns_dir / self.page_path(self.page), data, content_hash(data))
+        self.page += 1
+        self.features = []
+        self.offsets = []
+        self.hashes = []
+
+    def close(self):
+        """Write the last page and return the group's paging entry for the catalog"""
+        if self.features or self.page < self.pages:
+            self._flush()
+        for path in (self.patterns_dir / SHARDS_DIR / self.group_id).glob("*.json"):
+            if not path.stem.isdigit() or int(path.stem) >= self.pages:
+                path.unlink()
+        return {
+            "count": len(self.patterns),
+            "pages": self.pages,
+            "first_page": self.page_path(0)
+        }
+
+def write_catalog(patterns_dir, group_list, page_size, revision):
+    """Write catalog.json, the group list without any per-pattern data
+
+    Its size depends only on the number of groups, so clients can show the
+    groups before fetching any page. Shard directories of groups that no
+    longer exist are removed.
+    """
+    catalog = {
+        "version": INDEX_VERSION,
+        "revision": revision,
+        "page_size": page_size,
+        "groups": [
+            {
+                "id": group["id"],
+                "name": group["name"],
+                "description": group["description"],
+                **group["paging"],
+                "bundle": {key: group["bundle"][key] for key in ("file", "size")}
+            }
+            for group in group_list
+        ]
+    }
+    data = json.dumps(catalog, indent=2, ensure_ascii=False).encode("utf-8")
+    write_if_changed(patterns_dir / CATALOG_NAME, data, content_hash(data))
+
+    # No shards directory yet when no group has ever had patterns
+    shards_dir = patterns_dir / SHARDS_DIR
+    if not shards_dir.exists():
+        return
+    current = {group["id"] for group in group_list}
+    for path in shards_dir.iterdir():
+        if path.is_dir() and path.name not in current:
+            shutil.rmtree(path)
+
+def indented(value, level):
+    """json.dumps(value, indent=2) for a value nested `level` levels deep"""
+    return json.dumps(value, indent=2, ensure_ascii=False).replace("\n", "\n" + "  " * level)
+
+def write_list(out, items, level):
+    """Write a JSON list item by item, laid out like json.dump(indent=2)"""
+    pad = "  " * level
+    first = True
+    for item in items:
+        out.write(("[\n" if first else ",\n") + pad + "  " + indented(item, level + 1))
+        first = False
+    out.write("[]" if first else "\n" + pad + "]")
+
+
 def main():
+    parser = argparse.ArgumentParser(description="Build index.json and per-group pattern bundles")
+    parser.add_argument("--corpus-bundle", action="store_true",
+                        help="Also bundle every pattern into bundles/all.json")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: one per CPU)")
+    parser.add_argument("--hashed-files", action="store_true",
+                        help=f"Also write content-hashed copies to {HASHED_DIR}/ and {HASHED_MAP_NAME}")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE,
+                        help="Patterns per index shard page (default: %(default)s)")
+    args = parser.parse_args()
+    if args.page_size < 1:
+        parser.error("--page-size must be at least 1")
+
     patterns_dir = Path("patterns")
-    
-    # Read all pattern files
-    pattern_files = sorted(patterns_dir.glob("*.json"))
-    pattern_files = [f for f in pattern_files if f.name != "index.json"]
-    
-    # Group patterns
+
+    # Group pattern filenames by the longest matching prefix in groups.json
+    matcher = group_matcher()
     groups = defaultdict(list)
-    
-    for filepath in pattern_files:
-        filename = filepath.name
-        
-        # Determine group based on filename pattern
-        if filename.startswith("8beat_a_"):
-            groups["8beat-a"].append(filename)
-        elif filename.startswith("8beat_b_"):
-            groups["8beat-b"].append(filename)
-        elif filename.startswith("8beat_c_"):
-            groups["8beat-c"].append(filename)
-        elif filename.startswith("patt_"):
-            groups["misc"].append(filename)
-        else:
-            groups["other"].append(filename)
-    
-    # Build group metadata
+    for filename in scan_patterns(patterns_dir):
+        group = matcher.match(filename)
+        if group is None:
+            print(f"  skipped {filename}: no group in groups.json matches it")
+            continue
+        groups[group["id"]].append(filename)
+
     group_list = []
-    
-    if "8beat-a" in groups:
-        group_list.append({
-            "id": "8beat-a",
-            "title": "8-Beat Group A (Basic)",
-            "description": "Simple kick and snare combinations",
-            "patterns": sorted(groups["8beat-a"])
-        })
-    
-    if "8beat-b" in groups:
-        group_list.append({
-            "id": "8beat-b",
-            "title": "8-Beat Group B (Syncopated)",
-            "description": "Syncopation, anticipation, ghost notes",
-            "patterns": sorted(groups["8beat-b"])
-        })
-    
-    if "8beat-c" in groups:
-        group_list.append({
-            "id": "8beat-c",
-            "title": "8-Beat Group C (Dense)",
-            "description": "More kick drums (4-6 per bar)",
-            "patterns": sorted(groups["8beat-c"])
-        })
-    
-    if "misc" in groups:
-        group_list.append({
-            "id": "misc",
-            "title": "Miscellaneous Patterns",
-            "description": "Various practice patterns",
-            "patterns": sorted(groups["misc"])
-        })
-    
-    if "other" in groups:
-        group_list.append({
-            "id": "other",
-            "title": "Other Patterns",
-            "description": "Uncategorized patterns",
-            "patterns": sorted(groups["other"])
-        })
-    
-    # Create index structure
-    index_data = {
-        "version": "2.0",
-        "groups": group_list
-    }
-    
-    # Write index.json
+    for group_id, group in GROUP_REGISTRY.items():
+        if group_id in groups:
+            group_list.append({
+                "id": group_id,
+                "name": group["name"],
+                "description": group["description"],
+                "patterns": sorted(groups[group_id])
+            })
+
+    # One pass over every file, in group order; each group takes its share
+    filenames = [name for group in group_list for name in group["patterns"]]
+    results = parallel_map(index_pattern, (patterns_dir / name for name in filenames),
+                           args.workers, batch_size=CHUNK_SIZE)
+    corpus_bundle = BundleWriter(patterns_dir, "all") if args.corpus_bundle else None
+    # Every bundle opened, so that a failed build leaves no .tmp files
+    bundles = [corpus_bundle] if corpus_bundle is not None else []
+    hashed_files = {}
+    previous_revision, previous_hashes = load_revision_state(patterns_dir)
+    current_hashes = {}
+    skipped = 0
+
+    # Write index.json group by group; features and bundle offsets follow
+    # the group's pattern order
     index_file = patterns_dir / "index.json"
-    with open(index_file, 'w', encoding='utf-8') as f:
-        json.dump(index_data, f, indent=2, ensure_ascii=False)
-    
+    temp_file = index_file.with_name(index_file.name + ".tmp")
+    try:
+        with open(temp_file, 'w', encoding='utf-8') as out:
+            out.write(f'{{\n  "version": {json.dumps(INDEX_VERSION)},\n  "groups": [')
+            for i, group in enumerate(group_list):
+                out.write("\n    {" if i == 0 else ",\n    {")
+                bundle = BundleWriter(patterns_dir, group["id"])
+                bundles.append(bundle)
+                names = []
+                entries = []
+                offsets = []
+                hashes = []
+                for name, (entry, data, digest, error) in zip(group["patterns"], results):
+                    if error is not None:
+                        print(f"  skipped {name}: {error}")
+                        skipped += 1
+                        continue
+                    names.append(name)
+                    entries.append(entry)
+                    offsets.append(bundle.add(data))
+                    hashes.append(digest)
+                    current_hashes[name] = digest
+                    if corpus_bundle is not None:
+                        corpus_bundle.add(data)
+                    if args.hashed_files:
+                        hashed_files[name] = write_hashed_copy(patterns_dir, name, data, digest)
+                group["patterns"] = names
+
+                for key in ("id", "name", "description", "patterns"):
+                    out.write(f"\n      {json.dumps(key)}: {indented(group[key], 3)},")
+                out.write('\n      "features": ')
+                write_list(out, entries, 3)
+                out.write(f',\n      "hashes": {indented(hashes, 3)}')
+
+                shards = ShardWriter(patterns_dir, group, args.page_size)
+                for entry, offset, digest in zip(entries, offsets, hashes):
+                    shards.add(entry, offset, digest)
+                group["bundle"] = bundle.close()
+                group["paging"] = shards.close()
+                out.write(f',\n      "bundle": {indented(group["bundle"], 3)}\n    }}')
+            out.write("\n  ]" if group_list else "]")
+            if corpus_bundle is not None:
+                out.write(f',\n  "bundle": {indented(corpus_bundle.close(), 1)}')
+
+            # The revision only moves when some pattern changed
+            delta = None
+            if previous_hashes is None:
+                revision = previous_revision + 1
+            else:
+                delta = compute_delta(previous_hashes, current_hashes)
+                changed = any(delta.values())
+                revision = previous_revision + 1 if changed else previous_revision
+                if not changed:
+                    delta = None
+            out.write(f',\n  "revision": {revision}\n}}')
+        os.replace(temp_file, index_file)
+        if delta is not None:
+            delta_path = write_delta(patterns_dir, revision, delta)
+        write_revision_state(patterns_dir, revision, current_hashes)
+        write_catalog(patterns_dir, group_list, args.page_size, revision)
+        if args.hashed_files:
+            write_hashed_map(patterns_dir, hashed_files, revision)
+    finally:
+        results.close()
+        for bundle in bundles:
+            bundle.discard()
+        temp_file.unlink(missing_ok=True)
+
     # Print summary
     print("Index built successfully!")
     print(f"\nGroups:")
     for group in group_list:
-        print(f"  {group['id']}: {len(group['patterns'])} patterns - {group['title']}")
-    
+        print(f"  {group['id']}: {len(group['patterns'])} patterns - {group['name']}")
+
     total_patterns = sum(len(g['patterns']) for g in group_list)
     print(f"\nTotal patterns: {total_patterns}")
+    if skipped:
+        print(f"Skipped {skipped} unreadable pattern files")
+    print(f"Catalog: {CATALOG_NAME}, index pages of {args.page_size} in {SHARDS_DIR}/")
+    if delta is not None:
+        print(f"Revision {revision}: {len(delta['added'])} added, {len(delta['removed'])} removed, "
+              f"{len(delta['modified'])} modified ({delta_path})")
+    else:
+        print(f"Revision {revision}")
 
 if __name__ == "__main__":
     main()
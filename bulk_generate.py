@@ -0,0 +1,144 @@
+#!/usr/bin/env python3
+"""
+Vectorized bulk pattern generation with NumPy
+
+Batch versions of the random generators that draw N patterns at once.
+Each instrument lane is a uint8 bitmask over the 8th note grid of one
+bar (bit i = 8th note slot i, i.e. beat time i * 0.5). The draws follow
+the same distributions as the per-pattern functions they mirror:
+
+- basic_kick:      generate_8beat_patterns.create_basic_kick
+- syncopated_kick: generate_8beat_patterns.create_syncopated_kick
+- dense_kick:      generate_8beat_patterns.create_dense_kick
+- hihat_open_close: generate_hihat_patterns.create_hihat_open_close_events
+- single_tom_fill: generate_tom_patterns_fixed.create_single_tom_fill
+
+A batch is a dict mapping instrument name to (masks, velocities), where
+masks has shape (N,) and velocities is either a single int or an (N, 8)
+uint8 array indexed by slot.
+
+This is a standalone tool for sampling the distributions at scale; the
+corpus build draws every pattern from its own seeded random.Random.
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+NUM_SLOTS = 8
+ALL_SLOTS = (1 << NUM_SLOTS) - 1
+SLOT_INDEX = np.arange(NUM_SLOTS)
+
+
+def sample_subsets(rng, n, slots, low, high):
+    """Bitmask of a uniformly random subset of slots for each of n rows
+
+    The subset size is drawn uniformly from [low, high]. Ranking random
+    keys per row picks every subset of a given size with equal
+    probability, like random.sample.
+    """
+    slots = np.asarray(slots)
+    counts = rng.integers(low, high + 1, size=n)
+    ranks = rng.random((n, len(slots))).argsort(axis=1).argsort(axis=1)
+    chosen = ranks < counts[:, None]
+    return (chosen * (1 << slots)).sum(axis=1).astype(np.uint8)
+
+
+def sample_flags(rng, n, probability, slot):
+    """Bitmask with slot set in each row with the given probability"""
+    return np.where(rng.random(n) < probability, 1 << slot, 0).astype(np.uint8)
+
+
+def batch_basic_kick(rng, n):
+    """Beat 1 with p=0.9 plus 1-3 kicks on the other 8th notes"""
+    kick = sample_flags(rng, n, 0.9, 0)
+    kick |= sample_subsets(rng, n, [1, 2, 3, 4, 5, 6, 7], 1, 3)
+    return {"kick": (kick, 110)}
+
+
+def batch_syncopated_kick(rng, n):
+    """Beat 1 with p=0.7, 2-3 offbeats and one onbeat with p=0.5"""
+    kick = sample_flags(rng, n, 0.7, 0)
+    kick |= sample_subsets(rng, n, [1, 3, 5, 7], 2, 3)
+    onbeat = 1 << rng.choice([2, 4, 6], size=n)
+    kick |= np.where(rng.random(n) < 0.5, onbeat, 0).astype(np.uint8)
+    return {"kick": (kick, 110)}
+
+
+def batch_dense_kick(rng, n):
+    """Beat 1 plus 3-5 kicks on the other 8th notes"""
+    kick = np.ones(n, dtype=np.uint8)
+    kick |= sample_subsets(rng, n, [1, 2, 3, 4, 5, 6, 7], 3, 5)
+    return {"kick": (kick, 110)}
+
+
+def batch_hihat_open_close(rng, n):
+    """8th note hihat with 1-2 open positions"""
+    hihat_open = sample_subsets(rng, n, SLOT_INDEX, 1, 2)
+    hihat_closed = (ALL_SLOTS ^ hihat_open).astype(np.uint8)
+    return {
+        "hihat_open": (hihat_open, 75),
+        "hihat_closed": (hihat_closed, 80),
+    }
+
+
+def batch_single_tom_fill(rng, n):
+    """1-3 high tom hits off the backbeat, hihat removed under the toms"""
+    tom_high = sample_subsets(rng, n, [1, 3, 4, 5, 7], 1, 3)
+    velocities = rng.choice(np.array([95, 100, 105], dtype=np.uint8), size=(n, NUM_SLOTS))
+    hihat_closed = (ALL_SLOTS ^ tom_high).astype(np.uint8)
+    return {
+        "hihat_closed": (hihat_closed, 80),
+        "tom_high": (tom_high, velocities),
+    }
+
+
+BATCH_GENERATORS = {
+    "basic_kick": batch_basic_kick,
+    "syncopated_kick": batch_syncopated_kick,
+    "dense_kick": batch_dense_kick,
+    "hihat_open_close": batch_hihat_open_close,
+    "single_tom_fill": batch_single_tom_fill,
+}
+
+
+def generate_batch(kind, n, seed=None):
+    """Draw n patterns with the named batch generator"""
+    rng = np.random.default_rng(seed)
+    return BATCH_GENERATORS[kind](rng, n)
+
+
+def unpack_slots(masks):
+    """Boolean (N, 8) hit matrix from (N,) lane bitmasks"""
+    return (masks[:, None] >> SLOT_INDEX & 1).astype(bool)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Draw a batch of random lanes with NumPy")
+    parser.add_argument("kind", choices=sorted(BATCH_GENERATORS))
+    parser.add_argument("count", type=int)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--output", help="Save the lane bitmasks to this .npz file")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    start = time.perf_counter()
+    batch = generate_batch(args.kind, args.count, args.seed)
+    elapsed = time.perf_counter() - start
+
+    print(f"Generated {args.count} {args.kind} patterns in {elapsed:.3f}s")
+    for note, (masks, _) in batch.items():
+        frequency = unpack_slots(masks).mean(axis=0)
+        print(f"  {note}: hits per slot " + " ".join(f"{f:.2f}" for f in frequency))
+
+    if args.output:
+        np.savez_compressed(args.output, **{note: masks for note, (masks, _) in batch.items()})
+        print(f"Saved lanes to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,278 +7,151 @@ Groups:
 - Group C: Dense 8-beat (50 patterns) - More kick drums
 """
 
-import json
-import random
 from pathlib import Path
 
-def create_hihat_events():
-    """Create standard 8th note hihat pattern"""
-    events = []
-    for i in range(8):
-        events.append({
-            "time": i * 0.5,
-            "note": "hihat_closed",
-            "velocity": 80
-        })
-    return events
+from pattern_engine import (
+    EventBuffer,
+    create_hihat_events,
+    create_playback_schedule,
+    create_vexflow_notation,
+    register_group,
+    write_groups,
+)
 
-def create_basic_snare():
+def create_basic_snare(events, rng):
     """Snare on 2 and 4 (backbeat), with 0-1 additional hits"""
-    snare_events = []
     # Backbeat (positions 3 and 7 in 8th notes = beats 2 and 4)
-    snare_events.append({"time": 1.0, "note": "snare", "velocity": 100})
-    snare_events.append({"time": 3.0, "note": "snare", "velocity": 100})
+    events.add(1.0, "snare", 100)
+    events.add(3.0, "snare", 100)
     
     # Optional: add one extra snare
-    if random.random() < 0.3:
+    if rng.random() < 0.3:
         extra_positions = [0.5, 1.5, 2.0, 2.5, 3.5]
-        pos = random.choice(extra_positions)
-        snare_events.append({"time": pos, "note": "snare", "velocity": 90})
-    
-    return snare_events
+        pos = rng.choice(extra_positions)
+        events.add(pos, "snare", 90)
 
-def create_syncopated_snare():
+def create_syncopated_snare(events, rng):
     """Snare with syncopation - displaced or anticipated beats"""
-    snare_events = []
-    
     # Sometimes anticipate beat 2 or 4
-    if random.random() < 0.5:
+    if rng.random() < 0.5:
         # Anticipate beat 2 (move slightly earlier)
-        snare_events.append({"time": 0.875, "note": "snare", "velocity": 95})
+        events.add(0.875, "snare", 95)
     else:
-        snare_events.append({"time": 1.0, "note": "snare", "velocity": 100})
+        events.add(1.0, "snare", 100)
     
-    if random.random() < 0.5:
+    if rng.random() < 0.5:
         # Anticipate beat 4
-        snare_events.append({"time": 2.875, "note": "snare", "velocity": 95})
+        events.add(2.875, "snare", 95)
     else:
-        snare_events.append({"time": 3.0, "note": "snare", "velocity": 100})
+        events.add(3.0, "snare", 100)
     
     # Add 1-2 ghost notes or extra hits
-    extra_count = random.randint(1, 2)
+    extra_count = rng.randint(1, 2)
     extra_positions = [0.5, 1.5, 2.0, 2.5, 3.5]
-    random.shuffle(extra_positions)
+    rng.shuffle(extra_positions)
     for i in range(extra_count):
         pos = extra_positions[i]
-        vel = random.choice([50, 60, 90])  # ghost notes or accents
-        snare_events.append({"time": pos, "note": "snare", "velocity": vel})
-    
-    return snare_events
+        vel = rng.choice([50, 60, 90])  # ghost notes or accents
+        events.add(pos, "snare", vel)
 
-def create_basic_kick():
+def create_basic_kick(events, rng):
     """Simple kick patterns - 2-4 kicks per bar"""
-    kick_events = []
-    
     # Beat 1 is almost always there
-    if random.random() < 0.9:
-        kick_events.append({"time": 0.0, "note": "kick", "velocity": 110})
+    if rng.random() < 0.9:
+        events.add(0.0, "kick", 110)
     
     # Add 1-3 more kicks at various positions
     possible_positions = [0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5]
-    num_kicks = random.randint(1, 3)
-    positions = random.sample(possible_positions, num_kicks)
+    num_kicks = rng.randint(1, 3)
+    positions = rng.sample(possible_positions, num_kicks)
     
     for pos in positions:
-        kick_events.append({"time": pos, "note": "kick", "velocity": 110})
-    
-    return kick_events
+        events.add(pos, "kick", 110)
 
-def create_syncopated_kick():
+def create_syncopated_kick(events, rng):
     """Syncopated kick with offbeat emphasis"""
-    kick_events = []
-    
     # Sometimes skip beat 1
-    if random.random() < 0.7:
-        kick_events.append({"time": 0.0, "note": "kick", "velocity": 110})
+    if rng.random() < 0.7:
+        events.add(0.0, "kick", 110)
     
     # Focus on offbeats and syncopation
     offbeat_positions = [0.5, 1.5, 2.5, 3.5]
     onbeat_positions = [1.0, 2.0, 3.0]
     
     # Pick 2-3 offbeats
-    num_offbeats = random.randint(2, 3)
-    selected = random.sample(offbeat_positions, num_offbeats)
+    num_offbeats = rng.randint(2, 3)
+    selected = rng.sample(offbeat_positions, num_offbeats)
     
     # Maybe add 1 onbeat
-    if random.random() < 0.5:
-        selected.append(random.choice(onbeat_positions))
+    if rng.random() < 0.5:
+        selected.append(rng.choice(onbeat_positions))
     
     for pos in selected:
-        kick_events.append({"time": pos, "note": "kick", "velocity": 110})
-    
-    return kick_events
+        events.add(pos, "kick", 110)
 
-def create_dense_kick():
+def create_dense_kick(events, rng):
     """More kicks - 4-6 per bar"""
-    kick_events = []
-    
     # Beat 1 is always there
-    kick_events.append({"time": 0.0, "note": "kick", "velocity": 110})
+    events.add(0.0, "kick", 110)
     
     # Add 3-5 more kicks
     possible_positions = [0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5]
-    num_kicks = random.randint(3, 5)
-    positions = random.sample(possible_positions, num_kicks)
+    num_kicks = rng.randint(3, 5)
+    positions = rng.sample(possible_positions, num_kicks)
     
     for pos in positions:
-        kick_events.append({"time": pos, "note": "kick", "velocity": 110})
-    
-    return kick_events
-
-def create_vexflow_notation(events):
-    """Create VexFlow notation for the pattern"""
-    # Group events by time
-    time_map = {}
-    for evt in events:
-        t = evt["time"]
-        if t not in time_map:
-            time_map[t] = []
-        time_map[t].append(evt["note"])
-    
-    # Get all unique time positions and sort them
-    all_times = sorted(set([evt["time"] for evt in events]))
-    
-    # Use 8th notes (8 notes per bar)
-    notes = []
-    for i in range(8):
-        t = i * 0.5
-        # Round times to nearest 8th note (for any 16th note syncopation)
-        instruments = []
-        for check_time in [t - 0.125, t, t + 0.125]:
-            if check_time in time_map:
-                instruments.extend(time_map[check_time])
-        instruments = list(set(instruments))  # Remove duplicates
-
-        keys = []
-        if "kick" in instruments:
-            keys.append("f/4")
-        if "snare" in instruments:
-            keys.append("c/5")
-        if "hihat_closed" in instruments:
-            keys.append("g/5")
-
-        if keys:
-            notes.append({
-                "keys": keys,
-                "duration": "8"
-            })
-        else:
-            # Rest
-            notes.append({
-                "keys": ["b/4"],
-                "duration": "8r"
-            })
-    
-    return {
-        "staves": [{
-            "timeSignature": "4/4",
-            "voices": [{
-                "clef": "percussion",
-                "notes": notes
-            }]
-        }]
-    }
+        events.add(pos, "kick", 110)
 
-def generate_pattern(group, index, snare_func, kick_func):
+def generate_pattern(group, rng, snare_func, kick_func):
     """Generate a single pattern"""
-    pattern_id = f"8beat_{group}_{index:03d}"
-    
     # Combine all events
-    events = []
-    events.extend(create_hihat_events())
-    events.extend(snare_func())
-    events.extend(kick_func())
+    events = EventBuffer()
+    create_hihat_events(events)
+    snare_func(events, rng)
+    kick_func(events, rng)
     
     # Sort by time
-    events.sort(key=lambda x: x["time"])
+    events.sort()
     
     # Create pattern object
     pattern = {
-        "id": pattern_id,
-        "title": f"8-Beat {group.upper()} #{index}",
         "tags": ["8-beat", f"group-{group}"],
         "time_signature": "4/4",
         "bpm_default": 70,
         "loop_length_beats": 4,
+        "ppq": events.ppq,
         "events": events,
         "notation": {
-            "vexflow": create_vexflow_notation(events)
-        }
+            "vexflow": create_vexflow_notation(events, voice_time=False)
+        },
+        "playback": create_playback_schedule(events)
     }
     
     return pattern
 
+register_group(
+    "8beat-a", 50,
+    lambda i, rng: generate_pattern("a", rng, create_basic_snare, create_basic_kick),
+    unique=True,
+)
+register_group(
+    "8beat-b", 50,
+    lambda i, rng: generate_pattern("b", rng, create_syncopated_snare, create_syncopated_kick),
+    unique=True,
+)
+register_group(
+    "8beat-c", 50,
+    lambda i, rng: generate_pattern("c", rng, create_basic_snare, create_dense_kick),
+    unique=True,
+)
+
 def main():
-    patterns_dir = Path("patterns")
-    patterns_dir.mkdir(exist_ok=True)
-    
-    all_patterns = []
-    
-    # Group A: Basic 8-beat (50 patterns)
-    print("Generating Group A: Basic 8-beat...")
-    for i in range(1, 51):
-        pattern = generate_pattern("a", i, create_basic_snare, create_basic_kick)
-        filename = f"{pattern['id']}.json"
-        filepath = patterns_dir / filename
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(pattern, f, indent=2, ensure_ascii=False)
-        all_patterns.append(filename)
-        if i % 10 == 0:
-            print(f"  Generated {i}/50")
-    
-    # Group B: Syncopated 8-beat (50 patterns)
-    print("Generating Group B: Syncopated 8-beat...")
-    for i in range(1, 51):
-        pattern = generate_pattern("b", i, create_syncopated_snare, create_syncopated_kick)
-        filename = f"{pattern['id']}.json"
-        filepath = patterns_dir / filename
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(pattern, f, indent=2, ensure_ascii=False)
-        all_patterns.append(filename)
-        if i % 10 == 0:
-            print(f"  Generated {i}/50")
-    
-    # Group C: Dense 8-beat (50 patterns)
-    print("Generating Group C: Dense 8-beat...")
-    for i in range(1, 51):
-        pattern = generate_pattern("c", i, create_basic_snare, create_dense_kick)
-        filename = f"{pattern['id']}.json"
-        filepath = patterns_dir / filename
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(pattern, f, indent=2, ensure_ascii=False)
-        all_patterns.append(filename)
-        if i % 10 == 0:
-            print(f"  Generated {i}/50")
-    
-    # Update index.json
-    print("\nUpdating index.json...")
-    
-    # Read existing patterns
-    index_file = patterns_dir / "index.json"
-    if index_file.exists():
-        with open(index_file, 'r', encoding='utf-8') as f:
-            index_data = json.load(f)
-            existing_patterns = index_data.get("patterns", [])
-    else:
-        existing_patterns = []
-    
-    # Add new patterns (avoid duplicates)
-    for pattern in all_patterns:
-        if pattern not in existing_patterns:
-            existing_patterns.append(pattern)
-    
-    # Sort patterns
-    existing_patterns.sort()
-    
-    # Write index
-    index_data = {"patterns": existing_patterns}
-    with open(index_file, 'w', encoding='utf-8') as f:
-        json.dump(index_data, f, indent=2, ensure_ascii=False)
-    
-    print(f"\n✓ Generated {len(all_patterns)} new patterns")
-    print(f"✓ Total patterns in index: {len(existing_patterns)}")
+    script_dir = Path(__file__).parent
+    written, _ = write_groups(["8beat-a", "8beat-b", "8beat-c"], script_dir / "patterns")
+
+    print(f"\n✓ Generated {len(written)} new patterns")
+    print("  Run build_index_with_groups.py to update index.json")
     print("\nDone!")
 
 if __name__ == "__main__":
     main()
-
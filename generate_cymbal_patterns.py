@@ -5,237 +5,146 @@ Crash and ride cymbals always play simultaneously with kick drum.
 Includes variations: crash only, ride only, mixed, different kick patterns.
 """
 
-import json
-import os
+from pathlib import Path
 
-def create_basic_accompaniment(cymbal_positions):
+from pattern_engine import (
+    EventBuffer,
+    create_backbeat_snare,
+    create_hihat_events,
+    create_playback_schedule,
+    create_vexflow_notation,
+    register_group,
+    write_groups,
+)
+
+def create_basic_accompaniment(events, cymbal_ticks):
     """Create basic 8-beat hihat on all 8th notes + snare backbeat (beats 2, 4)
     
     Args:
-        cymbal_positions: Set of times where cymbals are played (no hihat at these positions)
+        events: EventBuffer to add the accompaniment to
+        cymbal_ticks: Set of ticks where cymbals are played (no hihat at these positions)
     """
-    events = []
     # Hihat on all 8th notes (closed), except where cymbals are played
-    for i in range(8):
-        time = i * 0.5
-        if time not in cymbal_positions:
-            events.append({
-                "time": time,
-                "note": "hihat_closed",
-                "velocity": 80
-            })
+    create_hihat_events(events, cymbal_ticks)
     # Snare on beats 2 and 4
-    events.append({"time": 1.0, "note": "snare", "velocity": 100})
-    events.append({"time": 3.0, "note": "snare", "velocity": 100})
-    return events
-
-def create_vexflow_notation(all_events):
-    """Generate VexFlow notation for complete pattern including hihat and snare"""
-    # VexFlow note positions
-    NOTE_POSITIONS = {
-        'kick': 'f/4',
-        'snare': 'c/5',
-        'hihat_closed': 'g/5',
-        'hihat_open': 'g/5',  # Same position, different symbol
-        'crash': 'a/5',
-        'ride': 'f/5',
-        'tom_high': 'd/5',
-        'tom_mid': 'b/4',
-        'tom_floor': 'a/4'
-    }
-    
-    # Group events by time
-    events_by_time = {}
-    for evt in all_events:
-        time = evt["time"]
-        if time not in events_by_time:
-            events_by_time[time] = []
-        events_by_time[time].append(evt["note"])
-    
-    # Generate notes for each 8th note position
-    notes = []
-    for i in range(8):  # 8 eighth notes in 4/4
-        time = i * 0.5
-        event_notes = events_by_time.get(time, [])
-        
-        if event_notes:
-            keys = [NOTE_POSITIONS[note] for note in event_notes]
-            # Remove duplicates and sort
-            keys = sorted(list(set(keys)))
-            notes.append({
-                "keys": keys,
-                "duration": "8"
-            })
-        else:
-            # Rest
-            notes.append({
-                "keys": ["b/4"],
-                "duration": "8r"
-            })
-    
-    return {
-        "vexflow": {
-            "staves": [
-                {
-                    "timeSignature": "4/4",
-                    "voices": [
-                        {
-                            "clef": "percussion",
-                            "notes": notes
-                        }
-                    ]
-                }
-            ]
-        }
-    }
+    create_backbeat_snare(events)
 
-def generate_pattern(number, kick_pattern, cymbal_type, description):
+def generate_pattern(kick_pattern, cymbal_type, description):
     """
     Generate a cymbal practice pattern.
     
     Args:
-        number: Pattern number (1-30)
         kick_pattern: List of times for kick drum hits
         cymbal_type: "crash", "ride", or "mixed"
         description: Japanese description of the pattern
     """
-    events = []
+    events = EventBuffer()
     
     # Add kick drum events
-    kick_events = []
     for time in kick_pattern:
-        kick_events.append({
-            "time": time,
-            "note": "kick",
-            "velocity": 110
-        })
-    events.extend(kick_events)
+        events.add(time, "kick", 110)
     
     # Add cymbal events (always synchronized with kick)
-    cymbal_events = []
+    cymbal_events = EventBuffer()
     for time in kick_pattern:
         if cymbal_type == "crash":
-            cymbal_events.append({
-                "time": time,
-                "note": "crash",
-                "velocity": 110
-            })
+            cymbal_events.add(time, "crash", 110)
         elif cymbal_type == "ride":
-            cymbal_events.append({
-                "time": time,
-                "note": "ride",
-                "velocity": 90
-            })
+            cymbal_events.add(time, "ride", 90)
         elif cymbal_type == "mixed":
             # Alternate between crash and ride
             note = "crash" if (len(cymbal_events) % 2 == 0) else "ride"
             velocity = 110 if note == "crash" else 90
-            cymbal_events.append({
-                "time": time,
-                "note": note,
-                "velocity": velocity
-            })
+            cymbal_events.add(time, note, velocity)
     events.extend(cymbal_events)
     
-    # Extract cymbal positions for hihat exclusion
-    cymbal_positions = set(evt["time"] for evt in cymbal_events)
-    
     # Add basic accompaniment (hihat + snare), excluding hihat at cymbal positions
-    events.extend(create_basic_accompaniment(cymbal_positions))
+    create_basic_accompaniment(events, cymbal_events.tick_set())
     
     # Sort by time
-    events.sort(key=lambda e: (e["time"], e["note"]))
+    events.sort(by_note=True)
     
     # Generate VexFlow notation
-    notation = create_vexflow_notation(events)
+    notation = {
+        "vexflow": create_vexflow_notation(events, voice_time=False, sort_keys=True)
+    }
     
     pattern = {
-        "name": f"8beat_i_{number:03d}",
         "description": description,
         "notation": notation,
+        "playback": create_playback_schedule(events),
+        "ppq": events.ppq,
         "events": events
     }
     
     return pattern
 
+# Category 1: Crash only - Basic kick patterns (8 patterns)
+CRASH_KICKS = [
+    ([0.0, 2.0], "クラッシュ - 1拍目と3拍目"),
+    ([0.0, 1.0, 2.0, 3.0], "クラッシュ - 全拍"),
+    ([0.0], "クラッシュ - 1拍目のみ"),
+    ([0.0, 0.5, 1.0, 1.5], "クラッシュ - 前半密集"),
+    ([0.0, 1.5, 3.0], "クラッシュ - シンコペーション"),
+    ([0.0, 2.5], "クラッシュ - 裏拍含む"),
+    ([0.5, 2.5], "クラッシュ - 裏拍のみ"),
+    ([0.0, 1.0, 2.5], "クラッシュ - 混合パターン"),
+]
+
+# Category 2: Ride only - Various kick patterns (8 patterns)
+RIDE_KICKS = [
+    ([0.0, 2.0], "ライド - 1拍目と3拍目"),
+    ([0.0, 1.0, 2.0, 3.0], "ライド - 全拍"),
+    ([0.0, 0.5, 2.0, 2.5], "ライド - 2回ずつ"),
+    ([0.0, 1.5, 2.0, 3.5], "ライド - シンコペーション"),
+    ([0.0, 2.5, 3.0], "ライド - 後半密集"),
+    ([1.0, 3.0], "ライド - 2拍目と4拍目"),
+    ([0.5, 1.5, 2.5, 3.5], "ライド - 全裏拍"),
+    ([0.0, 1.0, 1.5, 3.0], "ライド - 不規則"),
+]
+
+# Category 3: Mixed (crash and ride alternating) - Complex patterns (8 patterns)
+MIXED_KICKS = [
+    ([0.0, 1.0, 2.0, 3.0], "クラッシュ&ライド - 全拍交互"),
+    ([0.0, 0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5], "クラッシュ&ライド - 全8分音符"),
+    ([0.0, 1.0, 2.5], "クラッシュ&ライド - 混合A"),
+    ([0.0, 1.5, 3.0], "クラッシュ&ライド - 混合B"),
+    ([0.5, 1.5, 2.5, 3.5], "クラッシュ&ライド - 裏拍"),
+    ([0.0, 0.5, 2.0, 2.5], "クラッシュ&ライド - 前後分割"),
+    ([0.0, 1.0, 1.5, 2.0, 3.0, 3.5], "クラッシュ&ライド - 密集"),
+    ([0.0, 2.0, 3.5], "クラッシュ&ライド - スパース"),
+]
+
+# Category 4: Advanced patterns (6 patterns)
+ADVANCED = [
+    ([0.0, 0.5, 1.0], "クラッシュ - 3連続", "crash"),
+    ([2.0, 2.5, 3.0, 3.5], "ライド - 後半4連続", "ride"),
+    ([0.0, 0.5, 1.5, 2.0, 2.5, 3.5], "クラッシュ&ライド - 複雑", "mixed"),
+    ([1.0, 1.5, 2.0], "ライド - 中盤集中", "ride"),
+    ([0.0, 1.0, 2.0, 2.5, 3.0], "クラッシュ - 5回", "crash"),
+    ([0.5, 1.0, 2.0, 3.0, 3.5], "クラッシュ&ライド - 変則", "mixed"),
+]
+
+CYMBAL_PATTERNS = (
+    [(kicks, "crash", desc) for kicks, desc in CRASH_KICKS]
+    + [(kicks, "ride", desc) for kicks, desc in RIDE_KICKS]
+    + [(kicks, "mixed", desc) for kicks, desc in MIXED_KICKS]
+    + [(kicks, cymbal_type, desc) for kicks, desc, cymbal_type in ADVANCED]
+)
+
+register_group(
+    "8beat-i", len(CYMBAL_PATTERNS),
+    lambda i, rng: generate_pattern(*CYMBAL_PATTERNS[i - 1]),
+)
+
 def main():
-    patterns = []
-    pattern_num = 1
-    
-    # Category 1: Crash only - Basic kick patterns (8 patterns)
-    crash_kicks = [
-        ([0.0, 2.0], "クラッシュ - 1拍目と3拍目"),
-        ([0.0, 1.0, 2.0, 3.0], "クラッシュ - 全拍"),
-        ([0.0], "クラッシュ - 1拍目のみ"),
-        ([0.0, 0.5, 1.0, 1.5], "クラッシュ - 前半密集"),
-        ([0.0, 1.5, 3.0], "クラッシュ - シンコペーション"),
-        ([0.0, 2.5], "クラッシュ - 裏拍含む"),
-        ([0.5, 2.5], "クラッシュ - 裏拍のみ"),
-        ([0.0, 1.0, 2.5], "クラッシュ - 混合パターン"),
-    ]
-    
-    for kicks, desc in crash_kicks:
-        patterns.append(generate_pattern(pattern_num, kicks, "crash", desc))
-        pattern_num += 1
-    
-    # Category 2: Ride only - Various kick patterns (8 patterns)
-    ride_kicks = [
-        ([0.0, 2.0], "ライド - 1拍目と3拍目"),
-        ([0.0, 1.0, 2.0, 3.0], "ライド - 全拍"),
-        ([0.0, 0.5, 2.0, 2.5], "ライド - 2回ずつ"),
-        ([0.0, 1.5, 2.0, 3.5], "ライド - シンコペーション"),
-        ([0.0, 2.5, 3.0], "ライド - 後半密集"),
-        ([1.0, 3.0], "ライド - 2拍目と4拍目"),
-        ([0.5, 1.5, 2.5, 3.5], "ライド - 全裏拍"),
-        ([0.0, 1.0, 1.5, 3.0], "ライド - 不規則"),
-    ]
-    
-    for kicks, desc in ride_kicks:
-        patterns.append(generate_pattern(pattern_num, kicks, "ride", desc))
-        pattern_num += 1
-    
-    # Category 3: Mixed (crash and ride alternating) - Complex patterns (8 patterns)
-    mixed_kicks = [
-        ([0.0, 1.0, 2.0, 3.0], "クラッシュ&ライド - 全拍交互"),
-        ([0.0, 0.5, 1.0, 1.5, 2.0, 2.5, 3.0, 3.5], "クラッシュ&ライド - 全8分音符"),
-        ([0.0, 1.0, 2.5], "クラッシュ&ライド - 混合A"),
-        ([0.0, 1.5, 3.0], "クラッシュ&ライド - 混合B"),
-        ([0.5, 1.5, 2.5, 3.5], "クラッシュ&ライド - 裏拍"),
-        ([0.0, 0.5, 2.0, 2.5], "クラッシュ&ライド - 前後分割"),
-        ([0.0, 1.0, 1.5, 2.0, 3.0, 3.5], "クラッシュ&ライド - 密集"),
-        ([0.0, 2.0, 3.5], "クラッシュ&ライド - スパース"),
-    ]
-    
-    for kicks, desc in mixed_kicks:
-        patterns.append(generate_pattern(pattern_num, kicks, "mixed", desc))
-        pattern_num += 1
-    
-    # Category 4: Advanced patterns (6 patterns)
-    advanced = [
-        ([0.0, 0.5, 1.0], "クラッシュ - 3連続", "crash"),
-        ([2.0, 2.5, 3.0, 3.5], "ライド - 後半4連続", "ride"),
-        ([0.0, 0.5, 1.5, 2.0, 2.5, 3.5], "クラッシュ&ライド - 複雑", "mixed"),
-        ([1.0, 1.5, 2.0], "ライド - 中盤集中", "ride"),
-        ([0.0, 1.0, 2.0, 2.5, 3.0], "クラッシュ - 5回", "crash"),
-        ([0.5, 1.0, 2.0, 3.0, 3.5], "クラッシュ&ライド - 変則", "mixed"),
-    ]
-    
-    for kicks, desc, cymbal_type in advanced:
-        patterns.append(generate_pattern(pattern_num, kicks, cymbal_type, desc))
-        pattern_num += 1
-    
-    # Save patterns to JSON files
-    output_dir = "patterns"
-    os.makedirs(output_dir, exist_ok=True)
-    
-    for i, pattern in enumerate(patterns, 1):
-        filename = f"8beat_i_{i:03d}.json"
-        filepath = os.path.join(output_dir, filename)
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(pattern, f, indent=2, ensure_ascii=False)
+    script_dir = Path(__file__).parent
+    written, _ = write_groups(["8beat-i"], script_dir / "patterns")
+
+    for filename in written:
         print(f"Generated {filename}")
     
-    print(f"\nTotal: {len(patterns)} cymbal patterns generated")
+    print(f"\nTotal: {len(written)} cymbal patterns generated")
 
 if __name__ == "__main__":
     main()
@@ -6,15 +6,16 @@ Group H: Kick and Snare combinations (30 patterns)
 Focus on exploring all meaningful kick/snare combinations in 8-beat context
 """
 
-import json
 from pathlib import Path
 
-def create_basic_snare():
-    """Snare on 2 and 4 (backbeat) - standard for most patterns"""
-    return [
-        {"time": 1.0, "note": "snare", "velocity": 100},
-        {"time": 3.0, "note": "snare", "velocity": 100}
-    ]
+from pattern_engine import (
+    EventBuffer,
+    create_backbeat_snare,
+    create_playback_schedule,
+    create_vexflow_notation,
+    register_group,
+    write_groups,
+)
 
 def create_kick_patterns():
     """Define 30 distinct kick patterns"""
@@ -64,87 +65,37 @@ def create_kick_patterns():
     
     return patterns
 
-def create_vexflow_notation(events):
-    """Create VexFlow notation for the pattern"""
-    time_map = {}
-    for evt in events:
-        t = evt["time"]
-        if t not in time_map:
-            time_map[t] = []
-        time_map[t].append(evt["note"])
-
-    notes = []
-    for i in range(8):
-        t = i * 0.5
-        instruments = time_map.get(t, [])
-
-        keys = []
-        if "kick" in instruments:
-            keys.append("f/4")
-        if "snare" in instruments:
-            keys.append("c/5")
-
-        if keys:
-            notes.append({
-                "keys": keys,
-                "duration": "8"
-            })
-        else:
-            notes.append({
-                "keys": ["b/4"],
-                "duration": "8r"
-            })
-
-    return {
-        "staves": [{
-            "timeSignature": "4/4",
-            "voices": [{
-                "clef": "percussion",
-                "time": {"num_beats": 4, "beat_value": 4},
-                "notes": notes
-            }]
-        }]
-    }
-
-def generate_pattern(number, kick_events):
+def generate_pattern(kick_events):
     """Generate a single pattern"""
-    pattern_id = f"8beat_h_{number:03d}"
-
-    events = []
-    events.extend(create_basic_snare())
-    events.extend(kick_events)
+    events = EventBuffer()
+    create_backbeat_snare(events)
+    events.add_events(kick_events)
 
-    events.sort(key=lambda x: x["time"])
+    events.sort()
 
     pattern = {
-        "id": pattern_id,
-        "name": f"8-Beat H #{number}",
         "bpm": 70,
         "timeSignature": "4/4",
+        "ppq": events.ppq,
         "events": events,
         "notation": {
             "vexflow": create_vexflow_notation(events)
-        }
+        },
+        "playback": create_playback_schedule(events)
     }
 
     return pattern
 
-def main():
-    script_dir = Path(__file__).parent
-    patterns_dir = script_dir / "patterns"
-    patterns_dir.mkdir(exist_ok=True)
+KICK_PATTERNS = create_kick_patterns()
 
-    kick_patterns = create_kick_patterns()
+register_group(
+    "8beat-h", len(KICK_PATTERNS),
+    lambda i, rng: generate_pattern(KICK_PATTERNS[i - 1]),
+)
 
-    print("Generating Group H: Kick and Snare only patterns...")
-    for i in range(30):
-        pattern = generate_pattern(i + 1, kick_patterns[i])
-        filename = f"{pattern['id']}.json"
-        filepath = patterns_dir / filename
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(pattern, f, indent=2, ensure_ascii=False)
-        if (i + 1) % 10 == 0:
-            print(f"  Generated {i + 1}/30")
+def main():
+    script_dir = Path(__file__).parent
+    write_groups(["8beat-h"], script_dir / "patterns")
 
     print(f"\n✓ Generated 30 kick and snare patterns (Group H)")
     print("  Covering basic, four-on-floor, syncopated, dense, sparse, and double kick variations")
@@ -1,15 +1,23 @@
 #!/usr/bin/env python3
 """
 Generate 8-beat drum roll patterns
-Group I: Roll patterns (30 patterns)
+Group J: Roll patterns (30 patterns)
 
 Roll patterns using snare and toms in 8th note timing
 Useful for practicing hand movement across drums even at slower tempo
 """
 
-import json
 from pathlib import Path
 
+from pattern_engine import (
+    EventBuffer,
+    create_hihat_events,
+    create_playback_schedule,
+    create_vexflow_notation,
+    register_group,
+    write_groups,
+)
+
 def create_roll_patterns():
     """Define 30 distinct roll patterns"""
     patterns = []
@@ -253,116 +261,53 @@ def create_roll_patterns():
     
     return patterns
 
-def create_basic_accompaniment(roll_positions):
+def create_basic_accompaniment(events, roll_ticks):
     """Basic hihat and kick for context, excluding hihat at roll positions"""
-    events = [
-        {"time": 0.0, "note": "kick", "velocity": 110},
-        {"time": 1.0, "note": "snare", "velocity": 100},
-        {"time": 2.0, "note": "kick", "velocity": 110}
-    ]
+    events.add(0.0, "kick", 110)
+    events.add(1.0, "snare", 100)
+    events.add(2.0, "kick", 110)
     
     # Add hihat at all 8th note positions except where rolls occur
-    for i in range(8):
-        time_pos = i * 0.5
-        if time_pos not in roll_positions:
-            events.append({"time": time_pos, "note": "hihat_closed", "velocity": 80})
-    
-    return events
-
-def create_vexflow_notation(events):
-    """Create VexFlow notation for the pattern"""
-    time_map = {}
-    for evt in events:
-        t = evt["time"]
-        if t not in time_map:
-            time_map[t] = []
-        time_map[t].append(evt["note"])
-
-    notes = []
-    for i in range(8):
-        t = i * 0.5
-        instruments = time_map.get(t, [])
+    create_hihat_events(events, roll_ticks)
 
-        keys = []
-        if "kick" in instruments:
-            keys.append("f/4")
-        if "snare" in instruments:
-            keys.append("c/5")
-        if "tom_high" in instruments:
-            keys.append("d/5")
-        if "tom_mid" in instruments:
-            keys.append("b/4")
-        if "tom_floor" in instruments:
-            keys.append("a/4")
-        if "hihat_closed" in instruments:
-            keys.append("g/5")
-
-        if keys:
-            notes.append({
-                "keys": keys,
-                "duration": "8"
-            })
-        else:
-            notes.append({
-                "keys": ["b/4"],
-                "duration": "8r"
-            })
-
-    return {
-        "staves": [{
-            "timeSignature": "4/4",
-            "voices": [{
-                "clef": "percussion",
-                "time": {"num_beats": 4, "beat_value": 4},
-                "notes": notes
-            }]
-        }]
-    }
-
-def generate_pattern(number, roll_events):
+def generate_pattern(roll_events):
     """Generate a single pattern"""
-    pattern_id = f"8beat_i_{number:03d}"
-
-    # Extract roll positions to exclude hihat at those times
-    roll_positions = set(evt["time"] for evt in roll_events)
+    roll = EventBuffer()
+    roll.add_events(roll_events)
 
-    events = []
-    events.extend(create_basic_accompaniment(roll_positions))
-    events.extend(roll_events)
+    events = EventBuffer()
+    # Exclude hihat at roll positions
+    create_basic_accompaniment(events, roll.tick_set())
+    events.extend(roll)
 
-    events.sort(key=lambda x: (x["time"], x["note"]))
+    events.sort(by_note=True)
 
     pattern = {
-        "id": pattern_id,
-        "name": f"8-Beat I #{number}",
         "bpm": 70,
         "timeSignature": "4/4",
+        "ppq": events.ppq,
         "events": events,
         "notation": {
             "vexflow": create_vexflow_notation(events)
-        }
+        },
+        "playback": create_playback_schedule(events)
     }
 
     return pattern
 
-def main():
-    script_dir = Path(__file__).parent
-    patterns_dir = script_dir / "patterns"
-    patterns_dir.mkdir(exist_ok=True)
+ROLL_PATTERNS = create_roll_patterns()
 
-    roll_patterns = create_roll_patterns()
+# Group I is taken by the cymbal patterns, rolls are published as group J
+register_group(
+    "8beat-j", len(ROLL_PATTERNS),
+    lambda i, rng: generate_pattern(ROLL_PATTERNS[i - 1]),
+)
 
-    print("Generating Group I: Roll patterns...")
-    for i in range(30):
-        pattern = generate_pattern(i + 1, roll_patterns[i])
-        filename = f"{pattern['id']}.json"
-        filepath = patterns_dir / filename
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(pattern, f, indent=2, ensure_ascii=False)
-        if (i + 1) % 10 == 0:
-            print(f"  Generated {i + 1}/30")
+def main():
+    script_dir = Path(__file__).parent
+    write_groups(["8beat-j"], script_dir / "patterns")
 
-    print(f"\n✓ Generated 30 roll patterns (Group I)")
+    print(f"\n✓ Generated 30 roll patterns (Group J)")
     print("  Categories: Descending (10), Ascending (5), Round-trip (5), Tom-to-tom (10)")
     print("  8th note timing - slower tempo for practicing hand movement patterns")
     print("\nDone!")
@@ -8,262 +8,167 @@ Group G: Three Toms fills (20 patterns)
 Realistic drum fills: Toms replace hihat during fill sections
 """
 
-import json
-import random
 from pathlib import Path
 
-def create_basic_snare():
-    """Snare on 2 and 4 (backbeat)"""
-    return [
-        {"time": 1.0, "note": "snare", "velocity": 100},
-        {"time": 3.0, "note": "snare", "velocity": 100}
-    ]
-
-def create_varied_kick():
+from pattern_engine import (
+    EventBuffer,
+    create_backbeat_snare,
+    create_hihat_events,
+    create_playback_schedule,
+    create_vexflow_notation,
+    register_group,
+    write_groups,
+)
+
+def create_varied_kick(events, rng):
     """Various kick patterns with different densities"""
-    pattern_type = random.randint(1, 5)
+    pattern_type = rng.randint(1, 5)
 
     if pattern_type == 1:
         # Basic rock beat
-        return [
+        events.add_events([
             {"time": 0.0, "note": "kick", "velocity": 110},
             {"time": 2.0, "note": "kick", "velocity": 110}
-        ]
+        ])
     elif pattern_type == 2:
         # Four on the floor
-        return [
+        events.add_events([
             {"time": 0.0, "note": "kick", "velocity": 110},
             {"time": 1.0, "note": "kick", "velocity": 110},
             {"time": 2.0, "note": "kick", "velocity": 110},
             {"time": 3.0, "note": "kick", "velocity": 110}
-        ]
+        ])
     elif pattern_type == 3:
         # Syncopated
-        return [
+        events.add_events([
             {"time": 0.0, "note": "kick", "velocity": 110},
             {"time": 0.5, "note": "kick", "velocity": 105},
             {"time": 2.0, "note": "kick", "velocity": 110},
             {"time": 3.5, "note": "kick", "velocity": 105}
-        ]
+        ])
     elif pattern_type == 4:
         # Sparse
-        return [
+        events.add_events([
             {"time": 0.0, "note": "kick", "velocity": 110},
             {"time": 1.5, "note": "kick", "velocity": 105},
             {"time": 2.5, "note": "kick", "velocity": 110}
-        ]
+        ])
     else:
         # Dense
-        return [
+        events.add_events([
             {"time": 0.0, "note": "kick", "velocity": 110},
             {"time": 0.5, "note": "kick", "velocity": 105},
             {"time": 1.5, "note": "kick", "velocity": 105},
             {"time": 2.0, "note": "kick", "velocity": 110},
             {"time": 3.0, "note": "kick", "velocity": 110}
-        ]
+        ])
 
-def create_single_tom_fill():
+def create_single_tom_fill(rng):
     """Tom fill using only high tom - 1 to 3 hits
-    Returns: (tom_events, excluded_hihat_positions)"""
-    tom_events = []
-    num_hits = random.randint(1, 3)
+    Returns: EventBuffer of tom events"""
+    tom_events = EventBuffer()
+    num_hits = rng.randint(1, 3)
 
     # Possible positions for toms (avoid conflict with snare at 1.0 and 3.0)
     positions = [0.5, 1.5, 2.0, 2.5, 3.5]
-    selected = random.sample(positions, num_hits)
+    selected = rng.sample(positions, num_hits)
 
     for pos in selected:
-        tom_events.append({
-            "time": pos,
-            "note": "tom_high",
-            "velocity": random.choice([95, 100, 105])
-        })
+        tom_events.add(pos, "tom_high", rng.choice([95, 100, 105]))
 
-    return tom_events, set(selected)
+    return tom_events
 
-def create_two_tom_fill():
+def create_two_tom_fill(rng):
     """Tom fill using high and mid tom - 2 to 4 hits total
-    Returns: (tom_events, excluded_hihat_positions)"""
-    tom_events = []
-    num_hits = random.randint(2, 4)
+    Returns: EventBuffer of tom events"""
+    tom_events = EventBuffer()
+    num_hits = rng.randint(2, 4)
 
     positions = [0.5, 1.5, 2.0, 2.5, 3.5]
-    selected = random.sample(positions, num_hits)
+    selected = rng.sample(positions, num_hits)
 
     for i, pos in enumerate(sorted(selected)):
         # Alternate or create descending patterns
-        if random.random() < 0.5:
+        if rng.random() < 0.5:
             tom_type = "tom_high" if i % 2 == 0 else "tom_mid"
         else:
             # Descending pattern
             tom_type = "tom_high" if i < num_hits // 2 else "tom_mid"
 
-        tom_events.append({
-            "time": pos,
-            "note": tom_type,
-            "velocity": random.choice([95, 100, 105])
-        })
+        tom_events.add(pos, tom_type, rng.choice([95, 100, 105]))
     
-    return tom_events, set(selected)
+    return tom_events
 
-def create_three_tom_fill():
+def create_three_tom_fill(rng):
     """Tom fill using all three toms - 3 to 5 hits total
-    Returns: (tom_events, excluded_hihat_positions)"""
-    tom_events = []
-    num_hits = random.randint(3, 5)
+    Returns: EventBuffer of tom events"""
+    tom_events = EventBuffer()
+    num_hits = rng.randint(3, 5)
 
     positions = [0.5, 1.5, 2.0, 2.5, 3.0, 3.5]
-    selected = random.sample(positions, num_hits)
+    selected = rng.sample(positions, num_hits)
 
     toms = ["tom_high", "tom_mid", "tom_floor"]
 
     for i, pos in enumerate(sorted(selected)):
-        if random.random() < 0.7:
+        if rng.random() < 0.7:
             # Descending pattern (most common)
             tom_idx = min(i, 2)
             tom_type = toms[tom_idx]
         else:
             # Random
-            tom_type = random.choice(toms)
-
-        tom_events.append({
-            "time": pos,
-            "note": tom_type,
-            "velocity": random.choice([95, 100, 105, 110])
-        })
-
-    return tom_events, set(selected)
-
-def create_hihat_with_exclusions(excluded_positions):
-    """Create hihat pattern excluding specified positions (where toms are played)"""
-    events = []
-    for i in range(8):
-        time_pos = i * 0.5
-        # Only add hihat if no tom is playing at this position
-        if time_pos not in excluded_positions:
-            events.append({
-                "time": time_pos,
-                "note": "hihat_closed",
-                "velocity": 80
-            })
-    return events
-
-def create_vexflow_notation(events):
-    """Create VexFlow notation for the pattern"""
-    time_map = {}
-    for evt in events:
-        t = evt["time"]
-        if t not in time_map:
-            time_map[t] = []
-        time_map[t].append(evt["note"])
-
-    notes = []
-    for i in range(8):
-        t = i * 0.5
-        instruments = time_map.get(t, [])
-
-        keys = []
-        if "kick" in instruments:
-            keys.append("f/4")
-        if "snare" in instruments:
-            keys.append("c/5")
-        if "tom_high" in instruments:
-            keys.append("d/5")
-        if "tom_mid" in instruments:
-            keys.append("b/4")
-        if "tom_floor" in instruments:
-            keys.append("a/4")
-        if "hihat_closed" in instruments:
-            keys.append("g/5")
+            tom_type = rng.choice(toms)
 
-        if keys:
-            notes.append({
-                "keys": keys,
-                "duration": "8"
-            })
-        else:
-            notes.append({
-                "keys": ["b/4"],
-                "duration": "8r"
-            })
+        tom_events.add(pos, tom_type, rng.choice([95, 100, 105, 110]))
 
-    return {
-        "staves": [{
-            "timeSignature": "4/4",
-            "voices": [{
-                "clef": "percussion",
-                "time": {"num_beats": 4, "beat_value": 4},
-                "notes": notes
-            }]
-        }]
-    }
+    return tom_events
 
-def generate_pattern(group, number, tom_fill_func):
+def generate_pattern(rng, tom_fill_func):
     """Generate a single pattern"""
-    pattern_id = f"8beat_{group}_{number:03d}"
+    # Get tom fill, hihat is excluded where toms are played
+    tom_events = tom_fill_func(rng)
 
-    # Get tom fill and excluded hihat positions
-    tom_events, excluded_positions = tom_fill_func()
-
-    events = []
+    events = EventBuffer()
     # Add hihat EXCLUDING positions where toms are played
-    events.extend(create_hihat_with_exclusions(excluded_positions))
-    events.extend(create_basic_snare())
-    events.extend(create_varied_kick())
+    create_hihat_events(events, tom_events.tick_set())
+    create_backbeat_snare(events)
+    create_varied_kick(events, rng)
     events.extend(tom_events)
 
-    events.sort(key=lambda x: x["time"])
+    events.sort()
 
     pattern = {
-        "id": pattern_id,
-        "name": f"8-Beat {group.upper()} #{number}",
         "bpm": 70,
         "timeSignature": "4/4",
+        "ppq": events.ppq,
         "events": events,
         "notation": {
             "vexflow": create_vexflow_notation(events)
-        }
+        },
+        "playback": create_playback_schedule(events)
     }
 
     return pattern
 
+register_group(
+    "8beat-e", 25,
+    lambda i, rng: generate_pattern(rng, create_single_tom_fill),
+    unique=True,
+)
+register_group(
+    "8beat-f", 25,
+    lambda i, rng: generate_pattern(rng, create_two_tom_fill),
+    unique=True,
+)
+register_group(
+    "8beat-g", 20,
+    lambda i, rng: generate_pattern(rng, create_three_tom_fill),
+    unique=True,
+)
+
 def main():
     script_dir = Path(__file__).parent
-    patterns_dir = script_dir / "patterns"
-    patterns_dir.mkdir(exist_ok=True)
-
-    # Group E: Single Tom (25 patterns)
-    print("Generating Group E: Single Tom fills...")
-    for i in range(1, 26):
-        pattern = generate_pattern("e", i, create_single_tom_fill)
-        filename = f"{pattern['id']}.json"
-        filepath = patterns_dir / filename
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(pattern, f, indent=2, ensure_ascii=False)
-        if i % 10 == 0:
-            print(f"  Generated {i}/25")
-
-    # Group F: Two Toms (25 patterns)
-    print("Generating Group F: Two Tom fills...")
-    for i in range(1, 26):
-        pattern = generate_pattern("f", i, create_two_tom_fill)
-        filename = f"{pattern['id']}.json"
-        filepath = patterns_dir / filename
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(pattern, f, indent=2, ensure_ascii=False)
-        if i % 10 == 0:
-            print(f"  Generated {i}/25")
-
-    # Group G: Three Toms (20 patterns)
-    print("Generating Group G: Three Tom fills...")
-    for i in range(1, 21):
-        pattern = generate_pattern("g", i, create_three_tom_fill)
-        filename = f"{pattern['id']}.json"
-        filepath = patterns_dir / filename
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(pattern, f, indent=2, ensure_ascii=False)
-        if i % 10 == 0:
-            print(f"  Generated {i}/20")
+    write_groups(["8beat-e", "8beat-f", "8beat-g"], script_dir / "patterns")
 
     print(f"\n✓ Generated 70 tom fill patterns (E: 25, F: 25, G: 20)")
     print("  Toms replace hihat at fill positions (realistic drumming)")
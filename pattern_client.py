@@ -0,0 +1,319 @@
+#!/usr/bin/env python3
+"""
+Batch pattern fetch client
+
+Reads index.json from a pattern server (GitHub Pages, serve_patterns.py or
+any static server) and downloads whole groups concurrently over a small
+pool of reused HTTP/1.1 connections, with at most `concurrency` requests
+in flight. Downloads are checked against the index hashes, parsed and
+stored in an on-disk cache named by content hash, so a pattern that is
+already cached is never fetched again.
+
+Standard library only (brotli responses are accepted when the optional
+brotli package is installed).
+"""
+
+import argparse
+import asyncio
+import gzip
+import json
+import os
+import ssl
+import time
+import zlib
+from pathlib import Path
+from urllib.parse import urljoin, urlsplit
+
+from pattern_engine import HASH_LENGTH, brotli, content_hash, load_events
+
+DEFAULT_CONCURRENCY = 16
+DEFAULT_CACHE_DIR = ".pattern-cache"
+
+# Seconds allowed to connect, and to receive each response once sent
+DEFAULT_TIMEOUT = 30
+
+# Raised by the decompressors on a corrupt or truncated body
+DECODE_ERRORS = (OSError, EOFError, zlib.error) + ((brotli.error,) if brotli is not None else ())
+
+
+class FetchError(Exception):
+    """A pattern could not be downloaded or failed validation"""
+
+
+def check_pattern(data):
+    """Parse and validate a downloaded pattern, raising FetchError"""
+    try:
+        pattern = json.loads(data)
+    except ValueError as e:
+        raise FetchError(f"Invalid JSON: {e}") from None
+    if not isinstance(pattern, dict):
+        raise FetchError("Pattern is not a JSON object")
+    if "events" not in pattern:
+        raise FetchError("Pattern has no events")
+    try:
+        load_events(pattern)
+    except (KeyError, TypeError, ValueError) as e:
+        raise FetchError(f"Invalid events: {e!r}") from None
+    return pattern
+
+
+def decode_body(body, encoding):
+    """Undo a Content-Encoding, raising FetchError on a corrupt body"""
+    if encoding in ("", "identity"):
+        return body
+    try:
+        if encoding == "gzip":
+            return gzip.decompress(body)
+        if encoding == "br" and brotli is not None:
+            return brotli.decompress(body)
+    except DECODE_ERRORS as e:
+        raise FetchError(f"Corrupt {encoding} body: {e!r}") from e
+    raise FetchError(f"Unsupported Content-Encoding {encoding!r}")
+
+
+class ConnectionPool:
+    """Idle keep-alive connections to one host, reused across requests"""
+
+    def __init__(self, base_url):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.tls = parts.scheme == "https"
+        self.port = parts.port or (443 if self.tls else 80)
+        self.ssl = ssl.create_default_context() if self.tls else None
+        self.idle = []
+        self.opened = 0
+
+    async def acquire(self, timeout=None):
+        """(reader, writer, reused) of an idle connection or a new one
+
+        Raises asyncio.TimeoutError when connecting takes longer than
+        timeout seconds.
+        """
+        while self.idle:
+            reader, writer = self.idle.pop()
+            if not reader.at_eof() and not writer.is_closing():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port, ssl=self.ssl), timeout)
+        self.opened += 1
+        return reader, writer, False
+
+    def release(self, reader, writer, keep_alive):
+        if keep_alive:
+            self.idle.append((reader, writer))
+        else:
+            writer.close()
+
+    def close(self):
+        for _, writer in self.idle:
+            writer.close()
+        self.idle = []
+
+
+async def read_response(reader):
+    """(status, headers, body, keep_alive) of one HTTP/1.x response"""
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed before the response")
+    version, status, *_ = status_line.decode("latin-1").split(None, 2)
+
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b"\r\n", b"\n", b""):
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+
+    connection = headers.get("connection", "").lower()
+    keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+
+    if headers.get("transfer-encoding", "").lower() == "chunked":
+        chunks = []
+        while True:
+            size = int((await reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+                    pass
+                break
+            chunks.append(await reader.readexactly(size))
+            await reader.readexactly(2)
+        body = b"".join(chunks)
+    elif "content-length" in headers:
+        body = await reader.readexactly(int(headers["content-length"]))
+    else:
+        body = await reader.read()
+        keep_alive = False
+
+    return int(status), headers, body, keep_alive
+
+
+class PatternClient:
+    """Concurrent pattern downloader with a content-addressed disk cache"""
+
+    def __init__(self, base_url, cache_dir=DEFAULT_CACHE_DIR, concurrency=DEFAULT_CONCURRENCY,
+                 timeout=DEFAULT_TIMEOUT):
+        self.base_url = base_url if base_url.endswith("/") else base_url + "/"
+        self.timeout = timeout
+        self.cache_dir = Path(cache_dir)
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.pool = ConnectionPool(self.base_url)
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.downloaded = 0
+        self.cached = 0
+        self.bytes_received = 0
+
+    async def get(self, path):
+        """GET a path below the base URL and return the decoded body
+
+        Raises FetchError when connecting or receiving the response takes
+        longer than the client's timeout.
+        """
+        url = urlsplit(urljoin(self.base_url, path))
+        target = url.path + (f"?{url.query}" if url.query else "")
+        accept = "br, gzip" if brotli is not None else "gzip"
+        request = (f"GET {target} HTTP/1.1\r\nHost: {url.netloc}\r\n"
+                   f"Accept-Encoding: {accept}\r\nConnection: keep-alive\r\n\r\n").encode("latin-1")
+
+        async with self.semaphore:
+            # A reused connection may have been closed by the server while
+            # idle; retry once on a fresh one
+            for attempt in range(2):
+                try:
+                    reader, writer, reused = await self.pool.acquire(self.timeout)
+                except asyncio.TimeoutError:
+                    raise FetchError(f"Connecting for GET {target} timed out after "
+                                     f"{self.timeout}s") from None
+                try:
+                    writer.write(request)
+                    await writer.drain()
+                    status, headers, body, keep_alive = await asyncio.wait_for(
+                        read_response(reader), self.timeout)
+                except asyncio.TimeoutError:
+                    writer.close()
+                    raise FetchError(f"GET {target} timed out after {self.timeout}s") from None
+                except ValueError as e:
+                    # A malformed status line, header value or chunk size
+                    writer.close()
+                    raise FetchError(f"Malformed response to GET {target}: {e}") from e
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    writer.close()
+                    if reused and attempt == 0:
+                        continue
+                    raise
+                except BaseException:
+                    writer.close()
+                    raise
+                self.pool.release(reader, writer, keep_alive)
+                break
+
+        self.bytes_received += len(body)
+        if status != 200:
+            raise FetchError(f"GET {target} returned {status}")
+        return decode_body(body, headers.get("content-encoding", "").lower())
+
+    async def fetch_index(self):
+        """Download and parse index.json"""
+        return json.loads(await self.get("index.json"))
+
+    def cache_path(self, digest):
+        return self.cache_dir / f"{digest}.json"
+
+    async def fetch_pattern(self, filename, digest=None):
+        """Path of a pattern in the cache, downloading it unless cached
+
+        digest is the pattern's hash from the index; without one the
+        pattern is always downloaded and cached under its computed hash.
+        """
+        if digest is not None and self.cache_path(digest).exists():
+            self.cached += 1
+            return self.cache_path(digest)
+
+        data = await self.get(filename)
+        actual = content_hash(data)[:HASH_LENGTH]
+        if digest is not None and actual != digest:
+            raise FetchError(f"Hash mismatch: index says {digest}, got {actual}")
+        check_pattern(data)
+
+        path = self.cache_path(actual)
+        temp = path.with_name(path.name + f".{os.getpid()}.tmp")
+        temp.write_bytes(data)
+        os.replace(temp, path)
+        self.downloaded += 1
+        return path
+
+    async def sync(self, group_ids=None):
+        """Fetch every pattern of the given groups (default: all)
+
+        Returns (paths, errors): cache path and error message per filename.
+        """
+        index = await self.fetch_index()
+        jobs = []
+        for group in index["groups"]:
+            if group_ids is not None and group["id"] not in group_ids:
+                continue
+            hashes = group.get("hashes") or [None] * len(group["patterns"])
+            jobs.extend(zip(group["patterns"], hashes))
+
+        results = await asyncio.gather(
+            *(self.fetch_pattern(filename, digest) for filename, digest in jobs),
+            return_exceptions=True)
+
+        paths = {}
+        errors = {}
+        for (filename, _), result in zip(jobs, results):
+            if isinstance(result, BaseException):
+                if not isinstance(result, (FetchError, OSError, asyncio.IncompleteReadError)):
+                    raise result
+                errors[filename] = str(result) or type(result).__name__
+            else:
+                paths[filename] = result
+        return paths, errors
+
+    def close(self):
+        self.pool.close()
+
+
+async def sync_corpus(base_url, cache_dir=DEFAULT_CACHE_DIR, group_ids=None,
+                      concurrency=DEFAULT_CONCURRENCY, timeout=DEFAULT_TIMEOUT):
+    """Sync groups from base_url into cache_dir; returns (client, paths, errors)"""
+    client = PatternClient(base_url, cache_dir, concurrency, timeout)
+    try:
+        paths, errors = await client.sync(group_ids)
+    finally:
+        client.close()
+    return client, paths, errors
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Download pattern groups into a local cache")
+    parser.add_argument("base_url", help="URL of the patterns directory, e.g. http://127.0.0.1:8000/patterns/")
+    parser.add_argument("--group", action="append", dest="groups",
+                        help="Group id to fetch (repeatable; default: every group)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR)
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY,
+                        help="Maximum requests in flight (default: %(default)s)")
+    parser.add_argument("--timeout", type=float, default=DEFAULT_TIMEOUT,
+                        help="Seconds to wait for a connection or a response (default: %(default)s)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    start = time.perf_counter()
+    client, paths, errors = asyncio.run(
+        sync_corpus(args.base_url, args.cache_dir, args.groups, args.concurrency, args.timeout))
+    elapsed = time.perf_counter() - start
+
+    print(f"Synced {len(paths)} patterns in {elapsed:.2f}s: {client.downloaded} downloaded, "
+          f"{client.cached} cached, {client.bytes_received} bytes over {client.pool.opened} connections")
+    for filename, message in sorted(errors.items()):
+        print(f"  error: {filename}: {message}")
+    if errors:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
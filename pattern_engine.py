@@ -0,0 +1,1083 @@
+"""
+Shared pattern-generation engine
+
+Every generator script registers its groups here. The engine owns the
+common pieces (hihat/snare accompaniment, VexFlow notation, JSON output)
+so that the whole corpus can be produced in a single process.
+"""
+
+import functools
+import gzip
+import hashlib
+import importlib
+import json
+import math
+import os
+import random
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+from pathlib import Path
+
+try:
+    import brotli
+except ImportError:  # optional; .br siblings are skipped without it
+    brotli = None
+
+# Generator modules that register groups when imported
+GENERATOR_MODULES = [
+    "generate_8beat_patterns",
+    "generate_hihat_patterns",
+    "generate_tom_patterns_fixed",
+    "generate_kick_snare_patterns",
+    "generate_cymbal_patterns",
+    "generate_roll_patterns",
+]
+
+# VexFlow key per instrument, in the order keys are stacked in a chord
+NOTE_KEYS = {
+    "kick": "f/4",
+    "snare": "c/5",
+    "tom_high": "d/5",
+    "tom_mid": "b/4",
+    "tom_floor": "a/4",
+    "hihat_open": "g/5",
+    "hihat_closed": "g/5",
+    "crash": "a/5",
+    "ride": "f/5",
+}
+
+# Tick resolution of event times (ticks per quarter note). Must divide
+# evenly into 32nd notes and 16th note triplets, see set_ppq().
+PPQ = 480
+
+# Interned instrument table; events store an index into this list
+INSTRUMENTS = []
+INSTRUMENT_IDS = {}
+
+# Registered generated groups, keyed by groups.json id (e.g. "8beat-a")
+GROUPS = {}
+
+# Build manifest in the patterns directory: content hash per generated file
+MANIFEST_NAME = "manifest.json"
+
+# Files in the patterns directory that are not patterns
+NON_PATTERN_FILES = ("index.json", "catalog.json", "hashes.json", MANIFEST_NAME)
+
+# Encodings of the "events" field: a list of event objects, or one object
+# of parallel arrays (see EventBuffer.to_columns)
+EVENT_FORMATS = ("dicts", "columnar")
+
+# Precompressed siblings written next to each pattern in compress mode
+COMPRESSED_SUFFIXES = (".gz", ".br")
+
+# Distinct notations kept by the notation render cache
+NOTATION_CACHE_SIZE = 4096
+
+# Notation grids, coarsest first: (slots per beat, note value of one slot,
+# tuplet size or None). PPQ must be divisible by every slots per beat.
+NOTATION_GRIDS = (
+    (2, 8, None),
+    (3, 8, 3),
+    (4, 16, None),
+    (6, 16, 3),
+    (8, 32, None),
+    (12, 32, 3),
+)
+NOTATION_GRIDS_BY_SLOTS = {grid[0]: grid for grid in NOTATION_GRIDS}
+
+# VexFlow duration of a note value
+DURATION_NAMES = {1: "w", 2: "h", 4: "q", 8: "8", 16: "16", 32: "32"}
+BEAMED_DURATIONS = ("8", "16", "32")
+
+# Version of the canonical pattern schema written by normalize_pattern()
+SCHEMA_VERSION = 1
+
+# Tempo of patterns whose schema has none
+DEFAULT_BPM = 70
+
+# Limb playing each instrument, for the limb independence feature
+LIMBS = {
+    "kick": "right_foot",
+    "hihat_closed": "right_hand",
+    "hihat_open": "right_hand",
+    "ride": "right_hand",
+    "crash": "right_hand",
+    "snare": "left_hand",
+    "tom_high": "left_hand",
+    "tom_mid": "left_hand",
+    "tom_floor": "left_hand",
+}
+
+# Declarative group definitions shared by the generators and the index builder
+REGISTRY_PATH = Path(__file__).parent / "groups.json"
+
+# Onset resolution of the canonical form used for duplicate detection
+DEDUP_PPQ = 480
+
+# Redraws allowed per pattern before a group is considered exhausted
+MAX_DRAWS = 1000
+
+# Corpus seed used when none is given; every pattern derives its own seed from it
+DEFAULT_SEED = 0
+
+# Hex digits of a pattern's SHA-256 used in the index, hashed filenames and
+# client caches
+HASH_LENGTH = 16
+
+
+class PrefixTrie:
+    """Maps names to the value of their longest registered prefix
+
+    Lookups walk one node per character of the name, independent of how
+    many prefixes are registered. The empty prefix acts as a fallback.
+    """
+
+    _VALUE = object()
+
+    def __init__(self, items=()):
+        self.root = {}
+        for prefix, value in items:
+            self.insert(prefix, value)
+
+    def insert(self, prefix, value):
+        node = self.root
+        for char in prefix:
+            node = node.setdefault(char, {})
+        if self._VALUE in node:
+            raise ValueError(f"Prefix {prefix!r} is already registered")
+        node[self._VALUE] = value
+
+    def match(self, name):
+        """Value of the longest prefix of name, or None"""
+        node = self.root
+        value = node.get(self._VALUE)
+        for char in name:
+            node = node.get(char)
+            if node is None:
+                break
+            value = node.get(self._VALUE, value)
+        return value
+
+
+def load_group_registry(path=REGISTRY_PATH):
+    """Read the group definitions (id, name, description, prefix) of groups.json
+
+    Returns a dict keyed by group id, in registry order.
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        registry = json.load(f)
+    groups = {}
+    for group in registry["groups"]:
+        missing = {"id", "name", "description", "prefix"} - group.keys()
+        if missing:
+            raise ValueError(f"Group {group.get('id')!r} in {path} lacks {sorted(missing)}")
+        if group["id"] in groups:
+            raise ValueError(f"Group {group['id']!r} is defined twice in {path}")
+        groups[group["id"]] = group
+    return groups
+
+
+GROUP_REGISTRY = load_group_registry()
+
+
+def group_matcher(registry=None):
+    """PrefixTrie from filenames to the group definitions of the registry"""
+    if registry is None:
+        registry = GROUP_REGISTRY
+    return PrefixTrie((group["prefix"], group) for group in registry.values())
+
+
+def register_group(group_id, count, build, unique=False):
+    """Register the generator of a group declared in groups.json
+
+    Pattern ids and filenames are the group's registry prefix plus the
+    zero-padded pattern number (e.g. "8beat_a_" -> 8beat_a_001.json).
+
+    Args:
+        group_id: Group id in groups.json
+        count: Number of patterns in the group
+        build: Function taking a 1-based pattern number and a random.Random
+            and returning the pattern dict; its id is set from the prefix,
+            and its title defaults to "<group name> #<number>"
+        unique: Redraw patterns whose onsets duplicate another pattern's
+            (for randomly generated groups)
+    """
+    if group_id in GROUPS:
+        raise ValueError(f"Group {group_id!r} is already registered")
+    if group_id not in GROUP_REGISTRY:
+        raise ValueError(f"Group {group_id!r} is not declared in {REGISTRY_PATH.name}")
+    if not GROUP_REGISTRY[group_id]["prefix"]:
+        raise ValueError(f"Group {group_id!r} needs a filename prefix in {REGISTRY_PATH.name}")
+    GROUPS[group_id] = {
+        **GROUP_REGISTRY[group_id],
+        "count": count,
+        "build": build,
+        "unique": unique,
+    }
+    return GROUPS[group_id]
+
+
+def load_generators():
+    """Import every generator module so that all groups are registered"""
+    for name in GENERATOR_MODULES:
+        importlib.import_module(name)
+    return GROUPS
+
+
+def intern_instrument(note):
+    """Return the instrument id of a note name, adding it to the table if new"""
+    inst = INSTRUMENT_IDS.get(note)
+    if inst is None:
+        inst = len(INSTRUMENTS)
+        INSTRUMENTS.append(note)
+        INSTRUMENT_IDS[note] = inst
+    return inst
+
+
+for _note in NOTE_KEYS:
+    intern_instrument(_note)
+
+# (instrument id, VexFlow key) in chord stacking order
+NOTE_KEY_ORDER = [(INSTRUMENT_IDS[note], key) for note, key in NOTE_KEYS.items()]
+
+
+def set_ppq(ppq):
+    """Set the tick resolution used for newly created event buffers"""
+    global PPQ
+    if ppq <= 0 or ppq % 24:
+        raise ValueError(f"PPQ must be a positive multiple of 24, got {ppq}")
+    PPQ = ppq
+
+
+def to_ticks(beats, ppq=None):
+    """Convert a time in beats to integer ticks
+
+    Raises ValueError if the time does not fall on the tick grid.
+    """
+    ticks = beats * (ppq or PPQ)
+    rounded = round(ticks)
+    if abs(ticks - rounded) > 1e-6:
+        raise ValueError(f"Time {beats} is not on the {ppq or PPQ} PPQ tick grid")
+    return rounded
+
+
+class EventBuffer:
+    """Column-oriented list of drum events
+
+    Times are integer ticks at the buffer's PPQ, instruments are ids into
+    INSTRUMENTS and velocities are MIDI velocities. Generators put the
+    buffer itself into the pattern dict; it is only encoded (to_dicts or
+    to_columns) by serialize_pattern().
+    """
+
+    __slots__ = ("ppq", "ticks", "instruments", "velocities")
+
+    def __init__(self, ppq=None):
+        self.ppq = ppq or PPQ
+        self.ticks = array("i")
+        self.instruments = array("B")
+        self.velocities = array("B")
+
+    def __len__(self):
+        return len(self.ticks)
+
+    def add(self, time, note, velocity):
+        """Append an event at a time in beats"""
+        self.add_tick(to_ticks(time, self.ppq), note, velocity)
+
+    def add_tick(self, tick, note, velocity):
+        """Append an event at an integer tick"""
+        self.ticks.append(tick)
+        self.instruments.append(intern_instrument(note))
+        self.velocities.append(velocity)
+
+    def add_events(self, events):
+        """Append event dicts ({"time", "note", "velocity"})"""
+        for evt in events:
+            self.add(evt["time"], evt["note"], evt["velocity"])
+
+    def extend(self, other):
+        """Append all events of another buffer"""
+        if other.ppq != self.ppq:
+            raise ValueError(f"Cannot mix {other.ppq} and {self.ppq} PPQ buffers")
+        self.ticks.extend(other.ticks)
+        self.instruments.extend(other.instruments)
+        self.velocities.extend(other.velocities)
+
+    def tick_set(self):
+        """Set of ticks that have at least one event"""
+        return set(self.ticks)
+
+    def sort(self, by_note=False):
+        """Stable sort by time, optionally by (time, note name)"""
+        ticks = self.ticks
+        if by_note:
+            instruments = self.instruments
+            order = sorted(range(len(ticks)),
+                           key=lambda i: (ticks[i], INSTRUMENTS[instruments[i]]))
+        else:
+            order = sorted(range(len(ticks)), key=ticks.__getitem__)
+        self.ticks = array("i", [ticks[i] for i in order])
+        self.instruments = array("B", [self.instruments[i] for i in order])
+        self.velocities = array("B", [self.velocities[i] for i in order])
+
+    def to_dicts(self):
+        """Convert to the event dicts used in the pattern JSON
+
+        "time" is in beats for existing clients, "tick" is the exact
+        position at the pattern's "ppq".
+        """
+        ppq = self.ppq
+        return [
+            {"time": tick / ppq, "tick": tick, "note": INSTRUMENTS[inst], "velocity": velocity}
+            for tick, inst, velocity in zip(self.ticks, self.instruments, self.velocities)
+        ]
+
+    def to_columns(self):
+        """Convert to the columnar "events" object of the pattern JSON
+
+        "notes" indexes into the file's own "instruments" table, which
+        lists only the instruments the pattern uses.
+        """
+        used = sorted(set(self.instruments))
+        index = {inst: i for i, inst in enumerate(used)}
+        return {
+            "format": "columnar",
+            "instruments": [INSTRUMENTS[inst] for inst in used],
+            "ticks": list(self.ticks),
+            "notes": [index[inst] for inst in self.instruments],
+            "velocities": list(self.velocities),
+        }
+
+
+def load_events(pattern):
+    """EventBuffer of a pattern dict, from either event format
+
+    Accepts columnar events, event objects with "tick", and older event
+    objects that only have "time" in beats.
+    """
+    events = pattern["events"]
+    buffer = EventBuffer(pattern.get("ppq", PPQ))
+    if isinstance(events, dict):
+        if events.get("format") != "columnar":
+            raise ValueError(f"Unknown events format {events.get('format')!r}")
+        table = [intern_instrument(note) for note in events["instruments"]]
+        notes = events["notes"]
+        for note in notes:
+            if not 0 <= note < len(table):
+                raise ValueError(f"Columnar note index {note} is outside the "
+                                 f"{len(table)}-entry instruments table")
+        buffer.ticks.extend(events["ticks"])
+        buffer.instruments.extend(table[i] for i in notes)
+        buffer.velocities.extend(events["velocities"])
+        if not len(buffer.ticks) == len(buffer.instruments) == len(buffer.velocities):
+            raise ValueError("Columnar events have arrays of different lengths")
+    else:
+        for evt in events:
+            if "tick" in evt:
+                buffer.add_tick(evt["tick"], evt["note"], evt["velocity"])
+            else:
+                buffer.add(evt["time"], evt["note"], evt["velocity"])
+    return buffer
+
+
+def pattern_metadata(pattern):
+    """(id, bpm, loop length in beats) of a pattern in any of the corpus schemas"""
+    pattern_id = pattern.get("id") or pattern.get("name")
+    bpm = pattern.get("bpm_default") or pattern.get("bpm") or 0
+    loop_beats = pattern.get("loop_length_beats", 4)
+    return pattern_id, bpm, loop_beats
+
+
+def patterns_from_dir(patterns_dir):
+    """Yield the patterns of patterns/*.json in filename order"""
+    for filepath in sorted(Path(patterns_dir).glob("*.json")):
+        if filepath.name in NON_PATTERN_FILES:
+            continue
+        with open(filepath, 'r', encoding='utf-8') as f:
+            yield json.load(f)
+
+
+def create_hihat_events(events, excluded_ticks=()):
+    """Add closed hihat on all 8th notes, except at excluded ticks"""
+    eighth = events.ppq // 2
+    for i in range(8):
+        tick = i * eighth
+        if tick not in excluded_ticks:
+            events.add_tick(tick, "hihat_closed", 80)
+
+
+def create_backbeat_snare(events):
+    """Add snare on 2 and 4 (backbeat)"""
+    events.add(1.0, "snare", 100)
+    events.add(3.0, "snare", 100)
+
+
+def quantize(events, step, num_slots):
+    """Instrument bitmask per grid slot
+
+    Each event is snapped to the nearest multiple of step ticks with
+    integer arithmetic; events past the last slot are dropped.
+    """
+    half = step // 2
+    slots = [0] * num_slots
+    for tick, inst in zip(events.ticks, events.instruments):
+        slot = (tick + half) // step
+        if slot < num_slots:
+            slots[slot] |= 1 << inst
+    return slots
+
+
+def pattern_features(events, loop_beats=4):
+    """Difficulty and filter metrics of a pattern for index.json
+
+    events_per_bar and the offbeat ratio assume 4/4. limb_independence is
+    1 minus the mean Jaccard similarity of the onset positions of every
+    pair of limbs that play (see LIMBS): 0 when all limbs play in unison,
+    1 when no two limbs ever hit together.
+    """
+    bars = max(loop_beats / 4, 1)
+    limb_ticks = {}
+    instruments = set()
+    kicks = 0
+    offbeats = 0
+    for tick, inst in zip(events.ticks, events.instruments):
+        note = INSTRUMENTS[inst]
+        instruments.add(inst)
+        kicks += note == "kick"
+        offbeats += tick % events.ppq != 0
+        limb_ticks.setdefault(LIMBS.get(note, note), set()).add(tick)
+
+    limbs = list(limb_ticks.values())
+    pairs = [(a, b) for i, a in enumerate(limbs) for b in limbs[i + 1:]]
+    if pairs:
+        overlap = sum(len(a & b) / len(a | b) for a, b in pairs) / len(pairs)
+    else:
+        overlap = 1.0
+
+    return {
+        "events_per_bar": round(len(events) / bars, 2),
+        "kick_count": kicks,
+        "offbeat_ratio": round(offbeats / len(events), 3) if len(events) else 0.0,
+        "limb_independence": round(1 - overlap, 3),
+        "instruments": [INSTRUMENTS[inst] for inst in sorted(instruments)],
+    }
+
+
+def slot_signature(slots):
+    """Pack per-slot instrument bitmasks into one int
+
+    Each slot gets len(INSTRUMENTS) bits; the width is returned with the
+    packed value so that signatures stay unique as instruments are added.
+    """
+    width = len(INSTRUMENTS)
+    packed = 0
+    for i, mask in enumerate(slots):
+        packed |= mask << (i * width)
+    return len(slots), width, packed
+
+
+def parse_time_signature(time_signature):
+    """(beats per bar, beat value) of a "N/D" time signature"""
+    num, _, den = str(time_signature).partition("/")
+    try:
+        num, den = int(num), int(den)
+    except ValueError:
+        raise ValueError(f"Invalid time signature {time_signature!r}") from None
+    if num < 1 or den not in (1, 2, 4, 8, 16, 32):
+        raise ValueError(f"Invalid time signature {time_signature!r}")
+    return num, den
+
+
+def notation_grid(events, beat_value=4):
+    """Slots per beat of the coarsest NOTATION_GRIDS grid holding every onset
+
+    One pass folds the onset ticks into their gcd; a grid fits when its
+    step divides it. Only grids with a whole number of slots per
+    beat_value note are considered. Patterns that fit no grid get the
+    finest usable one and are snapped to it.
+    """
+    divisor = 0
+    for tick in events.ticks:
+        divisor = math.gcd(divisor, tick)
+    grids = [grid[0] for grid in NOTATION_GRIDS
+             if events.ppq % grid[0] == 0 and grid[0] * 4 % beat_value == 0] or [NOTATION_GRIDS[-1][0]]
+    for slots_per_beat in grids:
+        if divisor % (events.ppq // slots_per_beat) == 0:
+            return slots_per_beat
+    return grids[-1]
+
+
+def _note_keys(mask, sort_keys):
+    keys = []
+    for inst, key in NOTE_KEY_ORDER:
+        if mask >> inst & 1 and key not in keys:
+            keys.append(key)
+    if sort_keys:
+        keys.sort()
+    return keys
+
+
+def _render_beat(masks, denominator, tuplet, sort_keys, notes, tuplets):
+    """Append the notes of one beat; returns its beam as [first, last] or None
+
+    On binary grids the beat is halved until each part is silent (one
+    rest) or starts with its only onset (one note lasting the whole part),
+    so rests are grouped and a hit followed by silence gets the longer
+    note value. Triplet grids write every slot, in 3:2 tuplets of three
+    slots, unless only the first slot of a full beat sounds. masks may be
+    shorter than a beat at the end of a bar.
+    """
+    def emit(start, count):
+        if count & (count - 1):
+            # Not a power of two (a partial beat): largest power of two first
+            head = 1 << (count.bit_length() - 1)
+            emit(start, head)
+            emit(start + head, count - head)
+        elif not any(masks[start:start + count]):
+            notes.append({"keys": ["b/4"], "duration": DURATION_NAMES[denominator // count] + "r"})
+        elif count == 1 or not any(masks[start + 1:start + count]):
+            notes.append({"keys": _note_keys(masks[start], sort_keys),
+                          "duration": DURATION_NAMES[denominator // count]})
+        else:
+            emit(start, count // 2)
+            emit(start + count // 2, count // 2)
+
+    first = len(notes)
+    if tuplet and (any(masks[1:]) or len(masks) < tuplet * denominator // 8):
+        for start in range(len(masks)):
+            notes.append({"keys": _note_keys(masks[start], sort_keys) or ["b/4"],
+                          "duration": DURATION_NAMES[denominator] + ("" if masks[start] else "r")})
+        for start in range(first, len(notes) - tuplet + 1, tuplet):
+            tuplets.append({"notes": [start, start + tuplet - 1],
+                            "num_notes": tuplet, "notes_occupied": 2})
+    elif tuplet:
+        notes.append({"keys": _note_keys(masks[0], sort_keys), "duration": "q"})
+    else:
+        emit(0, len(masks))
+
+    # Beam from the first to the last flagged note of the beat
+    flagged = [i for i in range(first, len(notes)) if notes[i]["duration"] in BEAMED_DURATIONS]
+    if len(flagged) > 1:
+        return [flagged[0], flagged[-1]]
+    return None
+
+
+@functools.lru_cache(maxsize=NOTATION_CACHE_SIZE)
+def _render_notation(signature, voice_time, sort_keys):
+    """VexFlow notation of a grid and slot signature, see create_vexflow_notation()"""
+    slots_per_beat, beats_per_bar, beat_value, num_slots, width, packed = signature
+    _, denominator, tuplet = NOTATION_GRIDS_BY_SLOTS[slots_per_beat]
+    slot_mask = (1 << width) - 1
+    masks = [packed >> (i * width) & slot_mask for i in range(num_slots)]
+
+    # Slots per beat_value note; beats in the loops below are quarter notes
+    unit = slots_per_beat * 4 // beat_value
+    slots_per_bar = unit * beats_per_bar
+
+    staves = []
+    for bar_start in range(0, num_slots, slots_per_bar):
+        bar_end = min(bar_start + slots_per_bar, num_slots)
+        num_beats = (bar_end - bar_start) // unit
+        notes = []
+        beams = []
+        tuplets = []
+        for beat_start in range(bar_start, bar_end, slots_per_beat):
+            beat = masks[beat_start:min(beat_start + slots_per_beat, bar_end)]
+            if len(beat) == slots_per_beat and not any(beat):
+                notes.append({"keys": ["b/4"], "duration": "qr"})
+                continue
+            beam = _render_beat(beat, denominator, tuplet, sort_keys, notes, tuplets)
+            if beam:
+                beams.append(beam)
+
+        voice = {"clef": "percussion"}
+        if voice_time:
+            voice["time"] = {"num_beats": num_beats, "beat_value": beat_value}
+        voice["notes"] = notes
+        voice["beams"] = beams
+        voice["tuplets"] = tuplets
+        staves.append({"timeSignature": f"{num_beats}/{beat_value}", "voices": [voice]})
+
+    return {"staves": staves}
+
+
+def create_vexflow_notation(events, voice_time=True, sort_keys=False, loop_beats=4, time_signature="4/4"):
+    """Create VexFlow notation for the pattern on the coarsest fitting grid
+
+    The grid is picked by notation_grid(): 8th notes for plain 8-beat
+    patterns, 16ths for 0.25 offsets, triplets for thirds and so on. Each
+    bar of time_signature is one stave (a shorter last bar gets its own
+    time signature), notes are beamed per quarter note and rests are
+    grouped. Patterns that quantize to the same grid and slots share one
+    cached notation object (see notation_cache_info()), so the result must
+    not be modified.
+
+    Args:
+        events: EventBuffer of the pattern
+        voice_time: Include the "time" entry in each voice
+        sort_keys: Sort chord keys alphabetically instead of by instrument
+        loop_beats: Loop length in quarter note beats (rounded up to whole
+            beat_value notes)
+        time_signature: "N/D" time signature of the pattern
+    """
+    beats_per_bar, beat_value = parse_time_signature(time_signature)
+    slots_per_beat = notation_grid(events, beat_value)
+    unit = slots_per_beat * 4 // beat_value
+    num_slots = max(1, math.ceil(loop_beats * beat_value / 4 - 1e-9)) * unit
+    slots = quantize(events, events.ppq // slots_per_beat, num_slots)
+    signature = (slots_per_beat, beats_per_bar, beat_value) + slot_signature(slots)
+    return _render_notation(signature, voice_time, sort_keys)
+
+
+notation_cache_info = _render_notation.cache_info
+
+
+def create_playback_schedule(events, loop_beats=4):
+    """Playback-ready view of a pattern's events
+
+    Hits are grouped into clusters of simultaneous onsets in time order,
+    so a player walks flat arrays: cluster i starts at cluster_ticks[i]
+    (seconds = tick * 60 / (bpm * ppq)) and plays hits
+    cluster_starts[i]:cluster_starts[i + 1] of hit_samples (indices into
+    samples, in first-use order) at hit_gains (velocity / 127). Generators
+    sort their events first; an unsorted buffer is sorted here.
+    """
+    ticks = events.ticks
+    if all(a <= b for a, b in zip(ticks, ticks[1:])):
+        order = range(len(ticks))
+    else:
+        order = sorted(range(len(ticks)), key=ticks.__getitem__)
+
+    samples = []
+    sample_index = {}
+    cluster_ticks = []
+    cluster_starts = []
+    hit_samples = []
+    hit_gains = []
+    for i in order:
+        tick = ticks[i]
+        if not cluster_ticks or cluster_ticks[-1] != tick:
+            cluster_ticks.append(tick)
+            cluster_starts.append(len(hit_samples))
+        inst = events.instruments[i]
+        if inst not in sample_index:
+            sample_index[inst] = len(samples)
+            samples.append(INSTRUMENTS[inst])
+        hit_samples.append(sample_index[inst])
+        hit_gains.append(round(events.velocities[i] / 127, 4))
+    cluster_starts.append(len(hit_samples))
+
+    return {
+        "samples": samples,
+        "loop_ticks": to_ticks(loop_beats, events.ppq),
+        "cluster_ticks": cluster_ticks,
+        "cluster_starts": cluster_starts,
+        "hit_samples": hit_samples,
+        "hit_gains": hit_gains,
+    }
+
+
+def normalize_pattern(pattern, pattern_id=None):
+    """Upgrade a pattern in any of the corpus schemas to the canonical schema
+
+    Older schemas use name/bpm/timeSignature, and cymbal patterns only have
+    name and description. Files without a schema_version get their notation
+    regenerated from the events, since the old renderer only had 8th note
+    slots; freshly generated patterns (EventBuffer events) keep theirs.
+    pattern_id (e.g. the filename stem) is used when the pattern has
+    neither id nor name. Unknown fields are kept after the canonical ones.
+    """
+    events = pattern["events"]
+    stale_notation = not isinstance(events, EventBuffer) and "schema_version" not in pattern
+    if not isinstance(events, EventBuffer):
+        events = load_events(pattern)
+
+    pattern_id = pattern.get("id") or pattern.get("name") or pattern_id
+    if not pattern_id:
+        raise ValueError("Pattern has no id or name")
+    name = pattern.get("name")
+    description = pattern.get("description")
+    title = (pattern.get("title") or (name if name and name != pattern_id else None)
+             or description or pattern_id)
+
+    loop_beats = pattern.get("loop_length_beats", 4)
+    time_signature = pattern.get("time_signature") or pattern.get("timeSignature") or "4/4"
+    notation = pattern.get("notation")
+    if not notation or stale_notation:
+        notation = {"vexflow": create_vexflow_notation(
+            events, loop_beats=loop_beats, time_signature=time_signature)}
+    elif "vexflow" not in notation:
+        notation = {"vexflow": notation}
+
+    canonical = {"schema_version": SCHEMA_VERSION, "id": pattern_id, "title": title}
+    if description and description != title:
+        canonical["description"] = description
+    canonical.update({
+        "tags": pattern.get("tags", []),
+        "time_signature": time_signature,
+        "bpm_default": pattern.get("bpm_default") or pattern.get("bpm") or DEFAULT_BPM,
+        "loop_length_beats": loop_beats,
+        "ppq": events.ppq,
+        "events": events,
+        "notation": notation,
+        "playback": pattern.get("playback") or create_playback_schedule(events, loop_beats),
+    })
+    aliases = {"name", "bpm", "timeSignature", "description"}
+    for key, value in pattern.items():
+        if key not in canonical and key not in aliases:
+            canonical[key] = value
+    return canonical
+
+
+def pattern_filename(group_id, number):
+    """Filename of a pattern within the patterns directory, from its group's prefix"""
+    return f"{GROUPS[group_id]['prefix']}{number:03d}.json"
+
+
+def serialize_pattern(pattern, compact=False, event_format="dicts"):
+    """Pattern JSON as written to disk, in UTF-8 bytes
+
+    EventBuffers in the pattern are encoded in event_format. compact=True
+    drops indentation and the spaces after separators.
+    """
+    if event_format == "columnar":
+        encode_events = EventBuffer.to_columns
+    elif event_format == "dicts":
+        encode_events = EventBuffer.to_dicts
+    else:
+        raise ValueError(f"Unknown event format {event_format!r}")
+
+    if compact:
+        text = json.dumps(pattern, separators=(",", ":"), ensure_ascii=False,
+                          default=encode_events)
+    else:
+        text = json.dumps(pattern, indent=2, ensure_ascii=False, default=encode_events)
+    return text.encode("utf-8")
+
+
+def compress_variants(data):
+    """Precompressed encodings of serialized bytes, keyed by file suffix
+
+    Both encodings are deterministic (gzip without a timestamp), so
+    unchanged patterns produce unchanged siblings.
+    """
+    variants = {".gz": gzip.compress(data, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants[".br"] = brotli.compress(data, quality=11)
+    return variants
+
+
+def write_siblings(filepath, variants, json_changed):
+    """Write the .gz/.br siblings of a pattern file, removing stale ones
+
+    Returns the size of each written encoding, keyed by suffix.
+    """
+    sizes = {}
+    for suffix in COMPRESSED_SUFFIXES:
+        sibling = filepath.with_name(filepath.name + suffix)
+        if suffix in variants:
+            sizes[suffix] = len(variants[suffix])
+            if json_changed or not sibling.exists():
+                sibling.write_bytes(variants[suffix])
+        elif sibling.exists():
+            # Stale from an earlier compress build
+            sibling.unlink()
+    return sizes
+
+
+def content_hash(data):
+    """Hex SHA-256 of serialized pattern bytes"""
+    return hashlib.sha256(data).hexdigest()
+
+
+def write_if_changed(filepath, data, digest, known=None):
+    """Write data unless the file already holds it; return True if written
+
+    known is the manifest entry of the file. When its hash matches and the
+    file size is unchanged, the file is not read at all.
+    """
+    if filepath.exists():
+        if known and known["sha256"] == digest and filepath.stat().st_size == known["size"]:
+            return False
+        if filepath.read_bytes() == data:
+            return False
+    filepath.write_bytes(data)
+    return True
+
+
+def load_manifest(patterns_dir):
+    """Filename -> {"sha256", "size"} from the build manifest (empty if missing)"""
+    manifest_file = Path(patterns_dir) / MANIFEST_NAME
+    if not manifest_file.exists():
+        return {}
+    with open(manifest_file, 'r', encoding='utf-8') as f:
+        return json.load(f).get("patterns", {})
+
+
+def save_manifest(patterns_dir, entries):
+    """Write the build manifest if its content changed"""
+    manifest = {"version": 1, "patterns": dict(sorted(entries.items()))}
+    data = json.dumps(manifest, indent=2, ensure_ascii=False).encode("utf-8")
+    manifest_file = Path(patterns_dir) / MANIFEST_NAME
+    write_if_changed(manifest_file, data, content_hash(data))
+
+
+def canonical_key(events):
+    """Content address of a pattern's onsets
+
+    Hash of the sorted, de-duplicated (tick at DEDUP_PPQ, instrument)
+    pairs. Ids, titles and velocities are ignored, so two patterns that
+    play the same instruments at the same positions get the same key.
+    """
+    scale = DEDUP_PPQ / events.ppq
+    onsets = sorted({
+        (round(tick * scale), INSTRUMENTS[inst])
+        for tick, inst in zip(events.ticks, events.instruments)
+    })
+    text = ";".join(f"{tick}:{note}" for tick, note in onsets)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()[:32]
+
+
+def pattern_seed(seed, group_id, number, attempt=0):
+    """Derive the RNG seed of a single pattern from the corpus seed
+
+    The seed only depends on (seed, group id, number, attempt), so a pattern
+    comes out the same no matter which process builds it or in which
+    order. attempt counts redraws after duplicates.
+    """
+    key = f"{seed}/{group_id}/{number}"
+    if attempt:
+        key += f"/{attempt}"
+    digest = hashlib.sha256(key.encode()).digest()
+    return int.from_bytes(digest[:8], "big")
+
+
+def build_pattern(group_id, number, seed=DEFAULT_SEED, attempt=0):
+    """Build one pattern of a group with its own seeded RNG, in the canonical schema"""
+    rng = random.Random(pattern_seed(seed, group_id, number, attempt))
+    pattern = GROUPS[group_id]["build"](number, rng)
+    pattern["id"] = pattern_filename(group_id, number)[:-len(".json")]
+    if not any(key in pattern for key in ("title", "name", "description")):
+        pattern["title"] = f"{GROUPS[group_id]['name']} #{number}"
+    return normalize_pattern(pattern)
+
+
+def draw_unique(group_id, number, candidate, owners, redraw):
+    """Redraw a candidate until its canonical key is not owned by another pattern
+
+    candidate and the result of redraw(attempt) are tuples whose first item
+    is the canonical key. Groups that are not unique accept any candidate.
+    Records the accepted key in owners and returns (candidate, attempts).
+    """
+    attempt = 0
+    if GROUPS[group_id]["unique"]:
+        while candidate[0] in owners:
+            attempt += 1
+            if attempt > MAX_DRAWS:
+                raise RuntimeError(
+                    f"No unique pattern for {pattern_filename(group_id, number)} "
+                    f"after {MAX_DRAWS} draws; group {group_id!r} is exhausted")
+            candidate = redraw(attempt)
+    owners.setdefault(candidate[0], pattern_filename(group_id, number))
+    return candidate, attempt
+
+
+def generate_group(group_id, seed=DEFAULT_SEED, owners=None):
+    """Yield (filename, pattern) for every pattern of a group
+
+    owners maps canonical keys to the filenames that already use them;
+    duplicates are redrawn just like in write_groups().
+    """
+    if owners is None:
+        owners = {}
+    group = GROUPS[group_id]
+    for number in range(1, group["count"] + 1):
+        def redraw(attempt):
+            pattern = build_pattern(group_id, number, seed, attempt)
+            return canonical_key(pattern["events"]), pattern
+
+        (_, pattern), _ = draw_unique(group_id, number, redraw(0), owners, redraw)
+        yield pattern_filename(group_id, number), pattern
+
+
+def patterns_from_generators(seed=DEFAULT_SEED):
+    """Yield every registered pattern straight from the generators"""
+    groups = load_generators()
+    owners = {}
+    for group_id in sorted(groups):
+        for _, pattern in generate_group(group_id, seed, owners):
+            yield pattern
+
+
+def parallel_map(func, tasks, workers=None, initializer=None, initargs=(), batch_size=None):
+    """Yield func(task) for every task, in order, from a process pool
+
+    workers defaults to one per CPU. With one worker or fewer than two
+    tasks, everything runs in this process and initializer is not called.
+    Tasks are handed to the pool batch_size at a time (default: all at
+    once), which bounds the results in flight for long or lazy task lists.
+    The pool is shut down when the generator is exhausted or closed.
+    """
+    workers = workers or os.cpu_count() or 1
+    if batch_size is None:
+        tasks = list(tasks)
+        batch_size = max(1, len(tasks))
+    tasks = iter(tasks)
+    batch = list(islice(tasks, batch_size))
+    if workers == 1 or len(batch) < 2:
+        yield from map(func, batch)
+        yield from map(func, tasks)
+        return
+
+    chunksize = max(1, len(batch) // (workers * 4))
+    with ProcessPoolExecutor(workers, initializer=initializer, initargs=initargs) as executor:
+        while batch:
+            yield from executor.map(func, batch, chunksize=chunksize)
+            batch = list(islice(tasks, batch_size))
+
+
+def _init_worker(ppq, group_ids):
+    """Process pool initializer: match the parent's PPQ and group registry"""
+    set_ppq(ppq)
+    # Forked workers inherit the registry; spawned ones have to import it
+    if any(group_id not in GROUPS for group_id in group_ids):
+        load_generators()
+
+
+def _build_task(task):
+    """Build and serialize a single pattern candidate in a worker process"""
+    group_id, number, seed, attempt, compact, compress, event_format = task
+    pattern = build_pattern(group_id, number, seed, attempt)
+    data = serialize_pattern(pattern, compact, event_format)
+    variants = compress_variants(data) if compress else {}
+    if compact or event_format != "dicts":
+        indented = len(serialize_pattern(pattern))
+    else:
+        indented = len(data)
+    return canonical_key(pattern["events"]), data, variants, indented
+
+
+def _format_size(size):
+    return f"{size / 1024:.1f} KB"
+
+
+def print_size_report(group_ids, group_sizes):
+    """Print the per-group size of the written encodings against indented JSON"""
+    print("\nSize per group (indented JSON -> written):")
+    for group_id in group_ids:
+        sizes = group_sizes[group_id]
+        baseline = sizes["indented"]
+        parts = []
+        for suffix in (".json",) + COMPRESSED_SUFFIXES:
+            if suffix in sizes:
+                saved = 100 - 100 * sizes[suffix] / baseline
+                parts.append(f"{suffix[1:]} {_format_size(sizes[suffix])} (-{saved:.0f}%)")
+        print(f"  {GROUPS[group_id]['id']}: {_format_size(baseline)} -> " + ", ".join(parts))
+
+
+def write_groups(group_ids, patterns_dir="patterns", seed=DEFAULT_SEED, workers=None,
+                 force=False, compact=False, compress=False, event_format="dicts"):
+    """Generate the given groups and write the patterns whose content changed
+
+    Patterns are built in a process pool of `workers` processes (default:
+    one per CPU). Output is identical for any number of workers. Content
+    hashes are kept in the build manifest so unchanged files are left
+    untouched (force=True ignores the manifest and compares file contents).
+
+    The manifest also records each pattern's canonical_key(). Candidates
+    of unique groups whose onsets match an already accepted pattern, in
+    this run or in a group that is not rebuilt, are redrawn.
+
+    compact=True writes minified JSON; compress=True also writes .gz and
+    .br (if brotli is installed) siblings. event_format="columnar" stores
+    events as parallel arrays. Any of these modes prints a size report.
+
+    Returns:
+        (generated filenames, changed filenames)
+    """
+    patterns_dir = Path(patterns_dir)
+    patterns_dir.mkdir(exist_ok=True)
+    if compress and brotli is None:
+        print("brotli is not installed, writing .gz siblings only")
+
+    manifest = load_manifest(patterns_dir)
+    jobs = [
+        (group_id, number)
+        for group_id in group_ids
+        for number in range(1, GROUPS[group_id]["count"] + 1)
+    ]
+    tasks = [
+        (group_id, number, seed, 0, compact, compress, event_format)
+        for group_id, number in jobs
+    ]
+
+    # Canonical keys of patterns that are not rebuilt in this run; keys of
+    # accepted candidates are added in build order, so dedup is deterministic
+    rebuilt = {pattern_filename(group_id, number) for group_id, number in jobs}
+    owners = {
+        entry["canonical"]: filename
+        for filename, entry in sorted(manifest.items())
+        if filename not in rebuilt and "canonical" in entry
+    }
+
+    results = parallel_map(_build_task, tasks, workers, initializer=_init_worker,
+                           initargs=(PPQ, list(group_ids)))
+
+    written = []
+    changed = []
+    redrawn = 0
+    duplicates = []
+    counts = {}
+    group_sizes = {}
+    try:
+        for (group_id, number), candidate in zip(jobs, results):
+            def redraw(attempt):
+                return _build_task((group_id, number, seed, attempt,
+                                    compact, compress, event_format))
+
+            filename = pattern_filename(group_id, number)
+            if not GROUPS[group_id]["unique"] and candidate[0] in owners:
+                duplicates.append((filename, owners[candidate[0]]))
+            candidate, attempts = draw_unique(group_id, number, candidate, owners, redraw)
+            redrawn += attempts
+            key, data, variants, indented = candidate
+
+            filepath = patterns_dir / filename
+            entry = {"sha256": content_hash(data), "size": len(data), "canonical": key}
+            known = None if force else manifest.get(filename)
+            is_changed = write_if_changed(filepath, data, entry["sha256"], known)
+            sizes = write_siblings(filepath, variants, is_changed)
+            sizes[".json"] = len(data)
+            sizes["indented"] = indented
+
+            if group_id not in counts:
+                print(f"Generating {group_id}: {GROUPS[group_id]['name']}...")
+                counts[group_id] = 0
+                group_sizes[group_id] = dict.fromkeys(sizes, 0)
+            counts[group_id] += 1
+            for size_key, size in sizes.items():
+                group_sizes[group_id][size_key] += size
+            written.append(filename)
+            manifest[filename] = entry
+            if is_changed:
+                changed.append(filename)
+            if counts[group_id] == GROUPS[group_id]["count"]:
+                print(f"  Generated {counts[group_id]} patterns")
+    finally:
+        results.close()
+
+    save_manifest(patterns_dir, manifest)
+    if redrawn:
+        print(f"\nRedrew {redrawn} duplicate candidates")
+    for filename, owner in duplicates:
+        print(f"  warning: {filename} plays the same onsets as {owner}")
+
+    if compact or compress or event_format != "dicts":
+        print_size_report(list(counts), group_sizes)
+
+    print(f"\n{len(changed)} changed, {len(written) - len(changed)} unchanged")
+    for filename in changed:
+        print(f"  changed: {filename}")
+    return written, changed
@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Validate pattern files against the canonical schema and upgrade old ones
+
+SCHEMA is compiled once into a list of per-field checks; validate_pattern()
+runs them against a parsed pattern and returns every problem it finds.
+The command line checks a whole patterns directory in a process pool,
+upgrading files in the older schemas with pattern_engine.normalize_pattern()
+when --fix is given, and reports errors per file.
+"""
+
+import argparse
+import json
+import re
+from pathlib import Path
+
+from pattern_engine import (NON_PATTERN_FILES, SCHEMA_VERSION, content_hash, normalize_pattern,
+                            parallel_map, serialize_pattern, write_if_changed)
+
+NUMBER = (int, float)
+
+# Field -> constraints. "check" names an extra function for nested data.
+SCHEMA = {
+    "schema_version": {"type": int, "required": True, "enum": (SCHEMA_VERSION,)},
+    "id": {"type": str, "required": True, "pattern": r"[A-Za-z0-9_.\-]+"},
+    "title": {"type": str, "required": True},
+    "description": {"type": str},
+    "tags": {"type": list, "required": True, "items": str},
+    "time_signature": {"type": str, "required": True, "pattern": r"[1-9][0-9]*/(1|2|4|8|16|32)"},
+    "bpm_default": {"type": NUMBER, "required": True, "min": 20, "max": 400},
+    "loop_length_beats": {"type": NUMBER, "required": True, "min": 1},
+    "ppq": {"type": int, "required": True, "min": 24},
+    "events": {"type": (list, dict), "required": True, "check": "events"},
+    "notation": {"type": dict, "required": True, "check": "notation"},
+    "playback": {"type": dict, "check": "playback"},
+}
+
+EVENT_FIELDS = {"time": NUMBER, "tick": int, "note": str, "velocity": int}
+
+
+def is_type(value, types):
+    """isinstance() that does not count booleans as numbers"""
+    if not isinstance(types, tuple):
+        types = (types,)
+    return isinstance(value, types) and (bool in types or not isinstance(value, bool))
+
+
+def check_events(events, pattern, errors):
+    ppq = pattern.get("ppq")
+    if isinstance(events, dict):
+        if events.get("format") != "columnar":
+            errors.append(f"events: unknown format {events.get('format')!r}")
+            return
+        columns = ("ticks", "notes", "velocities")
+        if any(not isinstance(events.get(key), list) for key in columns + ("instruments",)):
+            errors.append("events: columnar events need instruments, ticks, notes and velocities lists")
+            return
+        if len({len(events[key]) for key in columns}) != 1:
+            errors.append("events: columnar arrays have different lengths")
+        rows = (
+            {"tick": tick, "note": events["instruments"][note]
+             if is_type(note, int) and 0 <= note < len(events["instruments"]) else None,
+             "velocity": velocity}
+            for tick, note, velocity in zip(events["ticks"], events["notes"], events["velocities"])
+        )
+    else:
+        rows = events
+
+    for i, event in enumerate(rows):
+        if not isinstance(event, dict):
+            errors.append(f"events[{i}]: expected an object")
+            continue
+        for field, types in EVENT_FIELDS.items():
+            if field in event and not is_type(event[field], types):
+                errors.append(f"events[{i}].{field}: expected {types_name(types)}")
+        tick = event.get("tick")
+        if not is_type(tick, int) or tick < 0:
+            errors.append(f"events[{i}].tick: expected a tick >= 0")
+        elif is_type(event.get("time"), NUMBER) and ppq and abs(event["time"] * ppq - tick) > 1e-6:
+            errors.append(f"events[{i}]: time {event['time']} does not match tick {tick} at ppq {ppq}")
+        if not isinstance(event.get("note"), str) or not event.get("note"):
+            errors.append(f"events[{i}].note: expected an instrument name")
+        velocity = event.get("velocity")
+        if not is_type(velocity, int) or not 1 <= velocity <= 127:
+            errors.append(f"events[{i}].velocity: expected 1..127, got {velocity!r}")
+
+
+def check_notation(notation, pattern, errors):
+    vexflow = notation.get("vexflow")
+    if not isinstance(vexflow, dict):
+        errors.append("notation.vexflow: expected an object")
+    elif not isinstance(vexflow.get("staves"), list) or not vexflow["staves"]:
+        errors.append("notation.vexflow.staves: expected a non-empty list")
+
+
+def check_playback(playback, pattern, errors):
+    fields = ("samples", "cluster_ticks", "cluster_starts", "hit_samples", "hit_gains")
+    if any(not isinstance(playback.get(key), list) for key in fields):
+        errors.append("playback: expected samples, cluster_ticks, cluster_starts, hit_samples "
+                      "and hit_gains lists")
+        return
+    if not is_type(playback.get("loop_ticks"), int) or playback["loop_ticks"] <= 0:
+        errors.append("playback.loop_ticks: expected a tick count > 0")
+    ticks = playback["cluster_ticks"]
+    starts = playback["cluster_starts"]
+    hits = playback["hit_samples"]
+    if any(not is_type(tick, int) for tick in ticks) or any(a >= b for a, b in zip(ticks, ticks[1:])):
+        errors.append("playback.cluster_ticks: expected strictly increasing ticks")
+    if (len(starts) != len(ticks) + 1 or starts[:1] != [0] or starts[-1:] != [len(hits)]
+            or any(not is_type(i, int) or i < 0 for i in starts)
+            or any(a >= b for a, b in zip(starts, starts[1:]))):
+        errors.append("playback.cluster_starts: expected one increasing offset per cluster "
+                      "from 0 to the hit count")
+    if len(playback["hit_gains"]) != len(hits):
+        errors.append("playback: hit_samples and hit_gains have different lengths")
+    if any(not is_type(i, int) or not 0 <= i < len(playback["samples"]) for i in hits):
+        errors.append("playback.hit_samples: expected indices into samples")
+    if any(not is_type(gain, NUMBER) or not 0 <= gain <= 1 for gain in playback["hit_gains"]):
+        errors.append("playback.hit_gains: expected gains in 0..1")
+
+
+CHECKS = {"events": check_events, "notation": check_notation, "playback": check_playback}
+
+
+def types_name(types):
+    if isinstance(types, tuple):
+        return " or ".join(t.__name__ for t in types)
+    return types.__name__
+
+
+def compile_schema(schema):
+    """Turn a schema dict into a validate(pattern) -> [error, ...] function"""
+    checks = []
+    for field, rules in schema.items():
+        types = rules.get("type", object)
+        required = rules.get("required", False)
+        enum = rules.get("enum")
+        pattern = re.compile(rules["pattern"]) if "pattern" in rules else None
+        minimum = rules.get("min")
+        maximum = rules.get("max")
+        items = rules.get("items")
+        extra = CHECKS[rules["check"]] if "check" in rules else None
+        expected = types_name(types)
+
+        def check(data, errors, field=field, types=types, required=required, enum=enum,
+                  pattern=pattern, minimum=minimum, maximum=maximum, items=items,
+                  extra=extra, expected=expected):
+            if field not in data:
+                if required:
+                    errors.append(f"{field}: missing")
+                return
+            value = data[field]
+            if not is_type(value, types):
+                errors.append(f"{field}: expected {expected}, got {type(value).__name__}")
+                return
+            if enum is not None and value not in enum:
+                errors.append(f"{field}: expected one of {list(enum)}, got {value!r}")
+            if pattern is not None and not pattern.fullmatch(value):
+                errors.append(f"{field}: {value!r} does not match {pattern.pattern}")
+            if minimum is not None and value < minimum:
+                errors.append(f"{field}: {value} is below {minimum}")
+            if maximum is not None and value > maximum:
+                errors.append(f"{field}: {value} is above {maximum}")
+            if items is not None and not all(is_type(item, items) for item in value):
+                errors.append(f"{field}: items must be {types_name(items)}")
+            if extra is not None:
+                extra(value, data, errors)
+
+        checks.append(check)
+
+    def validate(data):
+        if not isinstance(data, dict):
+            return ["pattern: expected a JSON object"]
+        errors = []
+        for check in checks:
+            check(data, errors)
+        return errors
+
+    return validate
+
+
+validate_pattern = compile_schema(SCHEMA)
+
+
+def check_file(filepath, fix=False):
+    """Validate one pattern file, upgrading it in place if fix is set
+
+    Files already at SCHEMA_VERSION are only validated, whatever their
+    layout (compact, columnar). Returns (filename, status, errors) where
+    status is "ok", "upgraded", "outdated" (would be upgraded by --fix) or
+    "invalid".
+    """
+    filepath = Path(filepath)
+    try:
+        pattern = json.loads(filepath.read_bytes())
+        if isinstance(pattern, dict) and pattern.get("schema_version") != SCHEMA_VERSION:
+            upgraded = serialize_pattern(normalize_pattern(pattern, filepath.stem))
+            pattern = json.loads(upgraded)
+        else:
+            upgraded = None
+    except (OSError, ValueError, KeyError, TypeError, OverflowError) as e:
+        return filepath.name, "invalid", [f"{type(e).__name__}: {e}"]
+
+    errors = validate_pattern(pattern)
+    if errors:
+        return filepath.name, "invalid", errors
+    if upgraded is None:
+        return filepath.name, "ok", []
+    if fix:
+        write_if_changed(filepath, upgraded, content_hash(upgraded))
+        return filepath.name, "upgraded", []
+    return filepath.name, "outdated", []
+
+
+def _check_task(task):
+    return check_file(*task)
+
+
+def check_directory(patterns_dir, fix=False, workers=None):
+    """check_file() every pattern of a directory in parallel, in filename order"""
+    filepaths = sorted(
+        path for path in Path(patterns_dir).glob("*.json") if path.name not in NON_PATTERN_FILES
+    )
+    tasks = [(path, fix) for path in filepaths]
+    return list(parallel_map(_check_task, tasks, workers))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Validate pattern files against the canonical schema")
+    parser.add_argument("patterns_dir", nargs="?", default="patterns")
+    parser.add_argument("--fix", action="store_true",
+                        help=f"Upgrade files to schema version {SCHEMA_VERSION} in place")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Number of worker processes (default: one per CPU)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    results = check_directory(args.patterns_dir, args.fix, args.workers)
+
+    counts = {}
+    for filename, status, errors in results:
+        counts[status] = counts.get(status, 0) + 1
+        if status == "invalid":
+            print(f"{filename}:")
+            for error in errors:
+                print(f"  {error}")
+        elif status == "outdated":
+            print(f"{filename}: older schema (run with --fix to upgrade)")
+
+    summary = ", ".join(f"{count} {status}" for status, count in sorted(counts.items()))
+    print(f"\nChecked {len(results)} files: {summary}")
+    if counts.get("invalid"):
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,508 @@
+#!/usr/bin/env python3
+"""
+Caching HTTP server for the patterns directory
+
+Serves patterns/ under /patterns/ (the GitHub Pages layout) with asyncio
+and the standard library only. Files are kept in an in-memory LRU cache
+together with their gzip and brotli encodings (the .gz/.br siblings of
+build_corpus.py --compress when present, compressed on load otherwise).
+
+Supports HTTP/1.1 keep-alive, GET and HEAD, ETag / If-None-Match,
+single byte ranges and Accept-Encoding negotiation. Encodings without a
+sibling are compressed on first use, at a fast level, only for the
+encoding a client negotiated; range requests are always served from the
+identity bytes. GET /_stats returns request counts, latency percentiles
+and cache counters as JSON.
+"""
+
+import argparse
+import asyncio
+import gzip
+import hashlib
+import json
+import time
+from bisect import bisect_left
+from collections import OrderedDict
+from email.utils import formatdate
+from pathlib import Path
+from urllib.parse import unquote, urlsplit
+
+from pattern_engine import brotli
+
+URL_PREFIX = "/patterns/"
+STATS_PATH = "/_stats"
+
+# Content encodings by preference, with the sibling file suffix of each
+ENCODINGS = [("br", ".br"), ("gzip", ".gz")]
+COMPRESSIBLE_SUFFIXES = (".json",)
+
+# Levels of on-the-fly compression; build_corpus.py --compress writes
+# siblings at the maximum levels instead
+GZIP_LEVEL = 6
+BROTLI_QUALITY = 5
+
+# Content-Type by file suffix (audio_preview.py writes .wav and .pcm)
+CONTENT_TYPES = {
+    ".json": "application/json; charset=utf-8",
+    ".wav": "audio/wav",
+}
+
+# Content-hashed copies never change, everything else must be revalidated
+IMMUTABLE_DIRS = ("content",)
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+DEFAULT_CACHE_CONTROL = "no-cache"
+
+# Upper bounds of the latency histogram buckets, in milliseconds
+LATENCY_BUCKETS_MS = [0.1, 0.25, 0.5, 1, 2.5, 5, 10, 25, 50, 100, 250, 500, 1000, float("inf")]
+
+REASONS = {
+    200: "OK",
+    206: "Partial Content",
+    304: "Not Modified",
+    400: "Bad Request",
+    404: "Not Found",
+    405: "Method Not Allowed",
+    416: "Range Not Satisfiable",
+    500: "Internal Server Error",
+}
+
+
+class CachedFile:
+    """A file's identity bytes and the encodings produced so far, with ETags
+
+    variants maps an encoding to its bytes, or to None when compressing
+    did not make the file smaller.
+    """
+
+    __slots__ = ("stamp", "content_type", "compressible", "variants", "digest", "size")
+
+    def __init__(self, stamp, content_type, compressible, variants):
+        self.stamp = stamp
+        self.content_type = content_type
+        self.compressible = compressible
+        self.variants = variants
+        self.digest = hashlib.sha256(variants["identity"]).hexdigest()[:16]
+        self.size = sum(len(data) for data in variants.values() if data)
+
+    def encodings(self):
+        """Encodings this file can be served in, produced or not"""
+        if not self.compressible:
+            return ("identity",)
+        available = [encoding for encoding, _ in ENCODINGS if encoding != "br" or brotli is not None]
+        return [encoding for encoding in available if self.variants.get(encoding, b"") is not None]
+
+    def etag(self, encoding):
+        # Strong ETags have to differ between encodings of the same file
+        return f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+
+    def add_variant(self, encoding, data):
+        self.variants[encoding] = data
+        self.size += len(data) if data else 0
+
+
+def compress(data, encoding):
+    """data in a content encoding, or None if that does not make it smaller"""
+    if encoding == "gzip":
+        encoded = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    else:
+        encoded = brotli.compress(data, quality=BROTLI_QUALITY)
+    return encoded if len(encoded) < len(data) else None
+
+
+class LRUCache:
+    """Size-bounded LRU cache of CachedFile entries
+
+    Entries are keyed by relative path and only returned while the file's
+    (mtime, size) stamp still matches.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.loads = 0
+
+    def get(self, key, stamp):
+        entry = self.entries.get(key)
+        if entry is None or entry.stamp != stamp:
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def fits(self, entry):
+        return entry.size <= self.max_bytes
+
+    def put(self, key, entry):
+        """Insert or re-account an entry; entries larger than the cache are not kept"""
+        old = self.entries.pop(key, None)
+        if old is not None:
+            self.size -= old.size
+        if entry.size > self.max_bytes:
+            return
+        self.entries[key] = entry
+        self.size += entry.size
+        while self.size > self.max_bytes:
+            _, evicted = self.entries.popitem(last=False)
+            self.size -= evicted.size
+
+
+class LatencyStats:
+    """Request counters and a latency histogram"""
+
+    def __init__(self):
+        self.requests = 0
+        self.by_status = {}
+        self.bytes_sent = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.buckets = [0] * len(LATENCY_BUCKETS_MS)
+
+    def record(self, status, elapsed, sent):
+        ms = elapsed * 1000
+        self.requests += 1
+        self.by_status[status] = self.by_status.get(status, 0) + 1
+        self.bytes_sent += sent
+        self.total_ms += ms
+        self.max_ms = max(self.max_ms, ms)
+        self.buckets[bisect_left(LATENCY_BUCKETS_MS, ms)] += 1
+
+    def percentile(self, fraction):
+        """Upper bound of the bucket holding the given fraction of requests"""
+        wanted = fraction * self.requests
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets):
+            seen += count
+            if count and seen >= wanted:
+                return min(bound, self.max_ms)
+        return 0.0
+
+    def summary(self):
+        return {
+            "requests": self.requests,
+            "by_status": {str(status): count for status, count in sorted(self.by_status.items())},
+            "bytes_sent": self.bytes_sent,
+            "latency_ms": {
+                "mean": round(self.total_ms / self.requests, 3) if self.requests else 0.0,
+                "p50": self.percentile(0.50),
+                "p95": self.percentile(0.95),
+                "p99": self.percentile(0.99),
+                "max": round(self.max_ms, 3),
+            },
+            "latency_buckets_ms": {
+                str(bound): count for bound, count in zip(LATENCY_BUCKETS_MS, self.buckets)
+            },
+        }
+
+
+def load_file(path, stamp):
+    """Read a file and its up-to-date .gz/.br siblings into a CachedFile"""
+    data = path.read_bytes()
+    variants = {"identity": data}
+    compressible = path.suffix in COMPRESSIBLE_SUFFIXES
+    if compressible:
+        for encoding, suffix in ENCODINGS:
+            sibling = path.with_name(path.name + suffix)
+            try:
+                if sibling.stat().st_mtime_ns >= stamp[0]:
+                    encoded = sibling.read_bytes()
+                    variants[encoding] = encoded if len(encoded) < len(data) else None
+            except OSError:
+                pass
+    content_type = CONTENT_TYPES.get(path.suffix, "application/octet-stream")
+    return CachedFile(stamp, content_type, compressible, variants)
+
+
+def negotiate_encoding(accept_encoding, available):
+    """Pick the preferred encoding of the file allowed by Accept-Encoding"""
+    accepted = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[name.strip().lower()] = quality
+    for encoding, _ in ENCODINGS:
+        if encoding in available and accepted.get(encoding, accepted.get("*", 0.0)) > 0:
+            return encoding
+    return "identity"
+
+
+def etag_matches(if_none_match, etag):
+    """Weak comparison of an ETag against an If-None-Match header"""
+    if if_none_match.strip() == "*":
+        return True
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
+
+
+def parse_range(header, length):
+    """(start, end) of a single byte range, or None to ignore the header
+
+    Multiple and malformed ranges are ignored, as RFC 9110 allows. Raises
+    ValueError when the range cannot be satisfied.
+    """
+    unit, _, spec = header.partition("=")
+    first, sep, last = spec.strip().partition("-")
+    if unit.strip().lower() != "bytes" or not sep:
+        return None
+    if not (first.isdigit() or first == "") or not (last.isdigit() or last == ""):
+        return None
+    if not first:
+        if not last or int(last) == 0:
+            raise ValueError(f"Unsatisfiable range {header}")
+        return max(0, length - int(last)), length - 1
+    start = int(first)
+    end = int(last) if last else length - 1
+    if start >= length:
+        raise ValueError(f"Range {header} starts past {length} bytes")
+    if end < start:
+        return None
+    return start, min(end, length - 1)
+
+
+class PatternServer:
+    """asyncio connection handler serving a patterns directory"""
+
+    def __init__(self, patterns_dir, cache_bytes):
+        self.root = Path(patterns_dir).resolve()
+        self.cache = LRUCache(cache_bytes)
+        self.stats = LatencyStats()
+        # Loads in progress, so concurrent misses on one file read it once
+        self.loading = {}
+        self.compressions = 0
+
+    def resolve(self, url_path):
+        """File under the root for a URL path, or None"""
+        if not url_path.startswith(URL_PREFIX):
+            return None
+        parts = url_path[len(URL_PREFIX):].split("/")
+        if any(part in ("", ".", "..") for part in parts):
+            return None
+        path = self.root.joinpath(*parts)
+        try:
+            if not path.resolve().is_relative_to(self.root) or not path.is_file():
+                return None
+        except OSError:
+            return None
+        return path
+
+    async def coalesce(self, key, func, *args):
+        """Run func in a worker thread, sharing the result among concurrent callers with the same key"""
+        task = self.loading.get(key)
+        if task is None:
+            task = asyncio.ensure_future(asyncio.to_thread(func, *args))
+            self.loading[key] = task
+            try:
+                return await task
+            finally:
+                del self.loading[key]
+        return await asyncio.shield(task)
+
+    async def load(self, key, path, stamp):
+        """Load a file into the cache, once per (key, stamp)"""
+        self.cache.loads += 1
+        entry = await self.coalesce((key, stamp), load_file, path, stamp)
+        self.cache.put(key, entry)
+        return entry
+
+    async def encode(self, key, entry, encoding):
+        """Bytes of entry in encoding, compressing on first use
+
+        Files too large for the cache are not compressed on the fly (they
+        would be compressed again on every request); they are served from
+        their siblings or as identity.
+        """
+        if encoding in entry.variants:
+            return entry.variants[encoding]
+        if not self.cache.fits(entry):
+            return None
+        data = await self.coalesce((key, entry.stamp, encoding), compress,
+                                   entry.variants["identity"], encoding)
+        if encoding not in entry.variants:
+            self.compressions += 1
+            entry.add_variant(encoding, data)
+            if self.cache.entries.get(key) is entry:
+                self.cache.put(key, entry)
+        return data
+
+    async def respond(self, method, target, headers):
+        """(status, headers, body) of one request"""
+        if method not in ("GET", "HEAD"):
+            return 405, {"Allow": "GET, HEAD"}, b""
+
+        url_path = unquote(urlsplit(target).path)
+        if url_path == STATS_PATH:
+            summary = self.stats.summary()
+            summary["cache"] = {
+                "entries": len(self.cache.entries),
+                "bytes": self.cache.size,
+                "hits": self.cache.hits,
+                "misses": self.cache.misses,
+                "loads": self.cache.loads,
+                "compressions": self.compressions,
+            }
+            body = json.dumps(summary, indent=2).encode("utf-8")
+            return 200, {"Content-Type": "application/json", "Cache-Control": "no-store"}, body
+
+        path = self.resolve(url_path)
+        if path is None:
+            return 404, {"Content-Type": "text/plain"}, b"Not found\n"
+
+        key = url_path
+        try:
+            stat = path.stat()
+            stamp = (stat.st_mtime_ns, stat.st_size)
+            entry = self.cache.get(key, stamp)
+            if entry is None:
+                entry = await self.load(key, path, stamp)
+        except FileNotFoundError:
+            # Deleted between resolve() and the read
+            return 404, {"Content-Type": "text/plain"}, b"Not found\n"
+        except OSError:
+            return 500, {"Content-Type": "text/plain"}, b"Internal server error\n"
+
+        # Ranges always address the identity encoding
+        range_header = headers.get("range")
+        encoding = "identity"
+        body = entry.variants["identity"]
+        if not range_header:
+            negotiated = negotiate_encoding(headers.get("accept-encoding", ""), entry.encodings())
+            if negotiated != "identity":
+                encoded = await self.encode(key, entry, negotiated)
+                if encoded is not None:
+                    encoding, body = negotiated, encoded
+
+        immutable = url_path[len(URL_PREFIX):].split("/", 1)[0] in IMMUTABLE_DIRS
+        response_headers = {
+            "ETag": entry.etag(encoding),
+            "Vary": "Accept-Encoding",
+            "Cache-Control": IMMUTABLE_CACHE_CONTROL if immutable else DEFAULT_CACHE_CONTROL,
+        }
+
+        if_none_match = headers.get("if-none-match")
+        if if_none_match is not None and etag_matches(if_none_match, entry.etag(encoding)):
+            return 304, response_headers, b""
+
+        response_headers["Content-Type"] = entry.content_type
+        response_headers["Accept-Ranges"] = "bytes"
+        if encoding != "identity":
+            response_headers["Content-Encoding"] = encoding
+
+        if range_header:
+            try:
+                byte_range = parse_range(range_header, len(body))
+            except ValueError:
+                response_headers["Content-Range"] = f"bytes */{len(body)}"
+                return 416, response_headers, b""
+            if byte_range is not None:
+                start, end = byte_range
+                response_headers["Content-Range"] = f"bytes {start}-{end}/{len(body)}"
+                return 206, response_headers, body[start:end + 1]
+
+        return 200, response_headers, body
+
+    async def handle(self, reader, writer):
+        """Serve the requests of one keep-alive connection"""
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                start = time.perf_counter()
+
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    method, target, version = None, None, "HTTP/1.0"
+
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b"\r\n", b"\n", b""):
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                connection = headers.get("connection", "").lower()
+                keep_alive = connection != "close" if version == "HTTP/1.1" else connection == "keep-alive"
+                # Request bodies are never read, so close the connection
+                # rather than parse a body as the next request
+                if (method not in ("GET", "HEAD") or "transfer-encoding" in headers
+                        or headers.get("content-length", "0") not in ("", "0")):
+                    keep_alive = False
+
+                if method is None:
+                    status, response_headers, body = 400, {"Content-Type": "text/plain"}, b"Bad request\n"
+                    keep_alive = False
+                else:
+                    status, response_headers, body = await self.respond(method, target, headers)
+
+                head = [f"HTTP/1.1 {status} {REASONS[status]}",
+                        f"Date: {formatdate(usegmt=True)}",
+                        f"Content-Length: {len(body)}",
+                        f"Connection: {'keep-alive' if keep_alive else 'close'}"]
+                head.extend(f"{name}: {value}" for name, value in response_headers.items())
+                writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+                sent = 0
+                if method != "HEAD" and status != 304:
+                    writer.write(body)
+                    sent = len(body)
+                await writer.drain()
+
+                self.stats.record(status, time.perf_counter() - start, sent)
+                if not keep_alive:
+                    break
+        except (ConnectionError, ValueError):
+            # ValueError: a request line or header longer than the stream limit
+            pass
+        finally:
+            writer.close()
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Serve patterns/ with caching, ETags, ranges and compression")
+    parser.add_argument("--patterns-dir", default="patterns",
+                        help="Directory served under /patterns/ (default: %(default)s)")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8000)
+    parser.add_argument("--cache-mb", type=float, default=64,
+                        help="Size of the in-memory file cache in MB (default: %(default)s)")
+    return parser.parse_args()
+
+
+async def serve(args):
+    server = PatternServer(args.patterns_dir, int(args.cache_mb * 1024 * 1024))
+    listener = await asyncio.start_server(server.handle, args.host, args.port)
+    encodings = "gzip, br" if brotli is not None else "gzip"
+    print(f"Serving {server.root} at http://{args.host}:{args.port}{URL_PREFIX} ({encodings})")
+    print(f"Stats at http://{args.host}:{args.port}{STATS_PATH}")
+    try:
+        async with listener:
+            await listener.serve_forever()
+    finally:
+        print(json.dumps(server.stats.summary()["latency_ms"]))
+
+
+def main():
+    args = parse_args()
+    try:
+        asyncio.run(serve(args))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
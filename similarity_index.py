@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""
+Similarity search over the pattern corpus
+
+Every pattern is reduced to a fingerprint: one onset bit vector per
+instrument on a fixed grid of GRID_SLOTS slots per bar (32nd notes), with
+events snapped to the nearest slot. Bit (lane * GRID_SLOTS + slot) is set
+when the lane's instrument plays on that slot. Only the bits that some
+pattern of the corpus sets are stored, since the rest are zero in every
+row; a fingerprint of the generated corpus fits in 2 words instead of 5.
+Fingerprints are packed into uint64 words and
+stored word-major, so comparing a query against the whole corpus is one
+XOR/AND plus popcount pass per word over contiguous arrays.
+
+Top-k selection works on the small integer bit counts. Jaccard scores
+are only computed for patterns that share enough onsets with the query
+to make the top k (a pattern sharing s onsets scores at most
+s / query onsets).
+
+Metrics:
+    hamming   number of differing onset bits (lower is more similar)
+    jaccard   shared onsets / onsets in either pattern (higher is more similar)
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import pattern_engine
+
+GRID_SLOTS = 32
+METRICS = ("jaccard", "hamming")
+
+if hasattr(np, "bitwise_count"):
+    popcount = np.bitwise_count
+else:
+    _BYTE_COUNTS = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+    def popcount(words, out=None):
+        """Per-word popcount for NumPy versions without bitwise_count"""
+        counts = _BYTE_COUNTS[words.view(np.uint8)]
+        return counts.reshape(*words.shape, words.itemsize).sum(axis=-1, dtype=np.uint8, out=out)
+
+
+def kth_smallest(counts, k):
+    """k-th smallest (0-based) of an array of bit counts"""
+    # NumPy partitions bytes far slower than 16-bit ints
+    return int(np.partition(counts.astype(np.uint16), k)[k])
+
+
+def kth_largest(counts, k):
+    """k-th largest (0-based) of an array of bit counts"""
+    # Selecting near the front of the array is much faster than near the back
+    ceiling = np.iinfo(np.uint16).max
+    return ceiling - kth_smallest(np.subtract(ceiling, counts, dtype=np.uint16), k)
+
+
+def fingerprint(events, lanes):
+    """Onset bit vector of an EventBuffer as a Python int
+
+    lanes maps instrument ids (pattern_engine.INSTRUMENTS) to lane numbers;
+    instruments without a lane are ignored. Only the first bar is used.
+    """
+    step = events.ppq * 4 // GRID_SLOTS
+    bits = 0
+    for slot, mask in enumerate(pattern_engine.quantize(events, step, GRID_SLOTS)):
+        while mask:
+            inst = (mask & -mask).bit_length() - 1
+            mask &= mask - 1
+            if inst in lanes:
+                bits |= 1 << (lanes[inst] * GRID_SLOTS + slot)
+    return bits
+
+
+def pack_words(bits, words):
+    """Split a fingerprint int into `words` little-endian uint64 words"""
+    return [(bits >> (64 * i)) & 0xFFFFFFFFFFFFFFFF for i in range(words)]
+
+
+def compact_bits(rows):
+    """Drop the bit columns that are zero in every row of a fingerprint matrix
+
+    Returns the compacted (rows, words) uint64 matrix and the original
+    position of each kept bit.
+    """
+    bits = np.unpackbits(rows.astype("<u8").view(np.uint8), axis=1, bitorder="little")
+    positions = np.flatnonzero(bits.any(axis=0))
+    words = max(1, (len(positions) + 63) // 64)
+    packed = np.zeros((len(rows), words * 8), dtype=np.uint8)
+    packed[:, :(len(positions) + 7) // 8] = np.packbits(bits[:, positions], axis=1,
+                                                       bitorder="little")
+    return packed.view("<u8").astype(np.uint64), positions
+
+
+class SimilarityIndex:
+    """Packed fingerprints of a corpus with top-k nearest neighbour queries
+
+    `ids` lists the pattern ids, `instruments` the instrument of each lane
+    and `fingerprints` is the (len(ids), words) uint64 matrix. Bit i of a
+    row is fingerprint bit `positions[i]`.
+    """
+
+    def __init__(self, ids, instruments, fingerprints, positions):
+        self.ids = list(ids)
+        self.instruments = list(instruments)
+        self.fingerprints = fingerprints
+        self.positions = np.asarray(positions, dtype=np.int64)
+        self._mask = sum(1 << position for position in self.positions.tolist())
+        self.columns = np.ascontiguousarray(fingerprints.T)
+        self.counts = popcount(fingerprints).sum(axis=1, dtype=np.uint16)
+        self._positions = {pattern_id: i for i, pattern_id in enumerate(self.ids)}
+        self._lanes = {
+            pattern_engine.intern_instrument(name): lane
+            for lane, name in enumerate(self.instruments)
+        }
+
+    def __len__(self):
+        return len(self.ids)
+
+    @classmethod
+    def from_patterns(cls, patterns):
+        """Build the index from pattern dicts (as generated or read from JSON)"""
+        # Instruments first interned while loading the patterns get no lane
+        instruments = list(pattern_engine.INSTRUMENTS)
+        lanes = {inst: inst for inst in range(len(instruments))}
+        words = (len(instruments) * GRID_SLOTS + 63) // 64
+
+        ids = []
+        rows = []
+        for pattern in patterns:
+            events = pattern["events"]
+            if not isinstance(events, pattern_engine.EventBuffer):
+                events = pattern_engine.load_events(pattern)
+            pattern_id, _, _ = pattern_engine.pattern_metadata(pattern)
+            ids.append(pattern_id)
+            rows.append(pack_words(fingerprint(events, lanes), words))
+
+        fingerprints = np.array(rows, dtype=np.uint64).reshape(len(rows), words)
+        return cls(ids, instruments, *compact_bits(fingerprints))
+
+    @classmethod
+    def load(cls, path):
+        """Load an index written by save()"""
+        with np.load(path) as data:
+            fingerprints = data["fingerprints"]
+            if "positions" in data:
+                positions = data["positions"]
+            else:
+                # Written before fingerprints were compacted
+                positions = np.arange(fingerprints.shape[1] * 64)
+            return cls(data["ids"].tolist(), data["instruments"].tolist(), fingerprints,
+                       positions)
+
+    def save(self, path):
+        """Write the index to a .npz file"""
+        np.savez(path, ids=np.array(self.ids), instruments=np.array(self.instruments),
+                 fingerprints=self.fingerprints, positions=self.positions)
+
+    def fingerprint_of(self, events):
+        """Packed fingerprint row of an EventBuffer in this index's bit layout
+
+        Returns the row and the number of the query's onset bits that no
+        indexed pattern sets, which the row cannot hold.
+        """
+        bits = fingerprint(events, self._lanes)
+        packed = 0
+        for i, position in enumerate(self.positions.tolist()):
+            packed |= ((bits >> position) & 1) << i
+        missing = bin(bits & ~self._mask).count("1")
+        return np.array(pack_words(packed, self.fingerprints.shape[1]), dtype=np.uint64), missing
+
+    def _bit_counts(self, op, query):
+        """popcount(op(fingerprint, query)) of every pattern, one word at a time"""
+        word = np.empty(len(self), dtype=np.uint64)
+        bits = np.empty(len(self), dtype=np.uint8)
+        # Up to three words cannot overflow a byte, and bytes are cheaper
+        total = np.zeros(len(self), dtype=np.uint8 if len(query) <= 3 else np.uint16)
+        for column, value in zip(self.columns, query):
+            op(column, value, out=word)
+            popcount(word, out=bits)
+            total += bits
+        return total
+
+    def _jaccard(self, shared, counts, query_count):
+        """Jaccard scores from shared onset counts and the fingerprints' own counts"""
+        union = counts.astype(np.int32) + query_count - shared
+        return shared / np.maximum(union, 1)
+
+    def scores(self, query, metric="jaccard", missing=0):
+        """Score of every pattern against a packed fingerprint row
+
+        missing counts query onsets outside the row (see fingerprint_of()).
+        """
+        if metric == "hamming":
+            distances = self._bit_counts(np.bitwise_xor, query)
+            if missing:
+                distances = distances.astype(np.uint16) + missing
+            return distances
+        if metric == "jaccard":
+            shared = self._bit_counts(np.bitwise_and, query)
+            return self._jaccard(shared, self.counts, int(popcount(query).sum()) + missing)
+        raise ValueError(f"Unknown metric {metric!r}, expected one of {METRICS}")
+
+    def query(self, key, k=10, metric="jaccard"):
+        """Top-k patterns most similar to a pattern id or EventBuffer
+
+        Returns (pattern id, score) pairs, best first; ties go to the
+        pattern indexed first. When querying by id the pattern itself is
+        left out.
+        """
+        if metric not in METRICS:
+            raise ValueError(f"Unknown metric {metric!r}, expected one of {METRICS}")
+        if isinstance(key, str):
+            position = self._positions[key]
+            query = self.fingerprints[position]
+            missing = 0
+        else:
+            position = None
+            query, missing = self.fingerprint_of(key)
+
+        wanted = min(k + (position is not None), len(self))
+        if wanted <= 0:
+            return []
+        if metric == "hamming":
+            distances = self.scores(query, metric, missing)
+            top = np.flatnonzero(distances <= kth_smallest(distances, wanted - 1))
+            scores = distances[top]
+            order = np.argsort(scores, kind="stable")
+        else:
+            # A pattern sharing s onsets scores at most s / query_count, so
+            # the exact scores of the patterns sharing the most onsets give
+            # a floor that rules out nearly everything else
+            shared = self._bit_counts(np.bitwise_and, query)
+            query_count = int(popcount(query).sum()) + missing
+            top = np.flatnonzero(shared >= kth_largest(shared, wanted - 1))
+            scores = self._jaccard(shared[top], self.counts[top], query_count)
+            floor = -np.partition(-scores, wanted - 1)[wanted - 1]
+            top = np.flatnonzero(shared >= np.ceil(floor * query_count - 1e-9))
+            scores = self._jaccard(shared[top], self.counts[top], query_count)
+            floor = -np.partition(-scores, wanted - 1)[wanted - 1]
+            top = top[scores >= floor]
+            scores = scores[scores >= floor]
+            order = np.argsort(-scores, kind="stable")
+
+        order = order[:wanted]
+        results = [(i, score) for i, score in zip(top[order].tolist(), scores[order].tolist())
+                   if i != position][:k]
+        return [(self.ids[i], score) for i, score in results]
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Build or query a pattern similarity index")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    build = subparsers.add_parser("build", help="Build a similarity index")
+    build.add_argument("output")
+    build.add_argument("--patterns-dir", default="patterns",
+                       help="Read patterns from this directory (default: %(default)s)")
+    build.add_argument("--generate", action="store_true",
+                       help="Build patterns with the generators instead of reading JSON")
+    build.add_argument("--seed", type=int, default=pattern_engine.DEFAULT_SEED)
+
+    query = subparsers.add_parser("query", help="List the patterns most similar to one")
+    query.add_argument("index")
+    query.add_argument("pattern_id")
+    query.add_argument("-k", type=int, default=10)
+    query.add_argument("--metric", choices=METRICS, default="jaccard")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+
+    if args.command == "build":
+        if args.generate:
+            patterns = pattern_engine.patterns_from_generators(args.seed)
+        else:
+            patterns = pattern_engine.patterns_from_dir(args.patterns_dir)
+        index = SimilarityIndex.from_patterns(patterns)
+        index.save(args.output)
+        print(f"Indexed {len(index)} patterns in {args.output}")
+        return
+
+    index = SimilarityIndex.load(args.index)
+    start = time.perf_counter()
+    results = index.query(args.pattern_id, args.k, args.metric)
+    elapsed = time.perf_counter() - start
+    print(f"Top {len(results)} by {args.metric} for {args.pattern_id} ({elapsed * 1000:.3f} ms):")
+    for pattern_id, score in results:
+        print(f"  {pattern_id}: {score:.3f}" if args.metric == "jaccard" else f"  {pattern_id}: {score}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+import gc
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+import pattern_engine  # noqa: E402
+from binary_corpus import CorpusReader, write_corpus  # noqa: E402
+from pattern_engine import EventBuffer  # noqa: E402
+
+
+def make_pattern(pattern_id, ticks):
+    events = EventBuffer()
+    for tick in ticks:
+        events.add_tick(tick, "kick", 100)
+    return {"id": pattern_id, "ppq": events.ppq, "events": events}
+
+
+def test_view_outlives_reader(tmp_path):
+    path = tmp_path / "corpus.bin"
+    write_corpus(path, [make_pattern("a", [0, 240]), make_pattern("b", [480])])
+
+    with CorpusReader(path) as reader:
+        for i in range(len(reader)):
+            events = reader.pattern_events(i)
+
+    # The last view is still readable after __exit__
+    assert events["tick"].tolist() == [480]
+    del events
+    gc.collect()
+
+
+def test_rejects_long_instrument_names(tmp_path, monkeypatch):
+    monkeypatch.setattr(pattern_engine, "INSTRUMENTS",
+                        pattern_engine.INSTRUMENTS + ["hihat_pedal_closed"])
+    with pytest.raises(ValueError, match="hihat_pedal_closed"):
+        write_corpus(tmp_path / "corpus.bin", [make_pattern("a", [0])])
+
+
+@pytest.mark.parametrize("bpm", [92.5, -1, 70000])
+def test_rejects_unstorable_bpm(tmp_path, bpm):
+    pattern = {**make_pattern("a", [0]), "bpm_default": bpm}
+    with pytest.raises(ValueError, match="bpm"):
+        write_corpus(tmp_path / "corpus.bin", [pattern])
@@ -0,0 +1,20 @@
+import json
+import subprocess
+import sys
+from pathlib import Path
+
+SCRIPT = Path(__file__).resolve().parent.parent / "build_index_with_groups.py"
+
+
+def test_empty_patterns_dir(tmp_path):
+    (tmp_path / "patterns").mkdir()
+
+    for _ in range(2):
+        subprocess.run([sys.executable, str(SCRIPT), "--workers", "1"], cwd=tmp_path,
+                       check=True, capture_output=True)
+
+    index = json.loads((tmp_path / "patterns" / "index.json").read_text(encoding="utf-8"))
+    catalog = json.loads((tmp_path / "patterns" / "catalog.json").read_text(encoding="utf-8"))
+    assert index["groups"] == []
+    assert catalog["groups"] == []
+    assert not list((tmp_path / "patterns").glob("*.tmp"))
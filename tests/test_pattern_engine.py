@@ -0,0 +1,23 @@
+import json
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from pattern_engine import create_vexflow_notation, load_events, normalize_pattern  # noqa: E402
+
+
+def test_normalize_regenerates_legacy_notation():
+    with open(ROOT / "patterns" / "patt_001.json", encoding="utf-8") as f:
+        pattern = json.load(f)
+
+    canonical = normalize_pattern(pattern)
+
+    vexflow = canonical["notation"]["vexflow"]
+    assert vexflow == create_vexflow_notation(load_events(pattern))
+    # The snares at 0.25 and 0.75 need a 16th note grid
+    durations = [note["duration"] for note in vexflow["staves"][0]["voices"][0]["notes"]]
+    assert durations[:4] == ["16", "16", "16", "16"]
+    # Once canonical, the notation is kept as is
+    assert normalize_pattern(canonical)["notation"] is canonical["notation"]
@@ -0,0 +1,35 @@
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from pattern_engine import EventBuffer  # noqa: E402
+from similarity_index import SimilarityIndex  # noqa: E402
+
+
+def make_pattern(pattern_id, hits):
+    events = EventBuffer()
+    for tick, note in hits:
+        events.add_tick(tick, note, 100)
+    return {"id": pattern_id, "ppq": events.ppq, "events": events}
+
+
+def test_query_scores_onsets_outside_the_index():
+    index = SimilarityIndex.from_patterns([
+        make_pattern("a", [(0, "kick"), (480, "snare")]),
+        make_pattern("b", [(0, "kick"), (960, "snare")]),
+        make_pattern("c", [(0, "kick"), (480, "snare"), (240, "hihat_closed")]),
+    ])
+    assert index.fingerprints.shape[1] == 1
+
+    assert index.query("a", 2) == [("c", 2 / 3), ("b", 1 / 3)]
+    assert index.query("a", 2, "hamming") == [("c", 1), ("b", 2)]
+
+    # No indexed pattern plays the ride, but it still counts against them
+    query = make_pattern("q", [(0, "kick"), (480, "snare"), (0, "ride")])["events"]
+    assert index.query(query, 1) == [("a", 2 / 3)]
+    assert index.query(query, 1, "hamming") == [("a", 1)]